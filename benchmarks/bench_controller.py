@@ -0,0 +1,213 @@
+"""End-to-end benchmark of a ``WpiMicro4Controller`` against the simulated device.
+
+The simulator runs in its own process, paced at the given baud rate, so the CPU
+time measured here is the driver's alone. The controller is driven the way FastCS
+drives it: ``connect`` with its initial sweep, then the poll scan at its tick.
+Measured are
+
+- ``startup_s``: line discovery and the initial sweep, until every PV has a value
+- ``once_sweep_s``: the initial sweep of every line at startup
+- ``poll``: queries/s and CPU per tick while polling for ``--duration`` seconds
+- ``saturated_queries_per_s``: back-to-back full sweeps, the link's ceiling
+- ``round_trip_ms``: p50/p99 of single ``?G`` query transactions
+- ``put_to_rbv_ms``: p50/p99 from a put of the rate to its readback updating
+- ``slider_settle_ms``: p50/p99 from the last of 20 puts 10 ms apart, as from a
+  dragged slider, until every put has returned with the last one read back
+
+Prints JSON, or writes it to ``--output``, to compare across commits::
+
+    python benchmarks/bench_controller.py --baudrate 9600 --output before.json
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any
+
+from fastcs_wpi_micro4.usb_connection import USBConnectionSettings
+from fastcs_wpi_micro4.wpi_micro4_controller import WpiMicro4Controller
+
+
+class TransactionLog:
+    """Records the duration and query count of every line transaction."""
+
+    def __init__(self, controller: WpiMicro4Controller):
+        self.transactions: list[tuple[float, int]] = []
+        send_line_queries = controller.connection.send_line_queries
+
+        async def timed(
+            queries: list[tuple[int | None, str]], periodic: bool = False
+        ) -> list[str]:
+            start = time.perf_counter()
+            responses = await send_line_queries(queries, periodic)
+            self.transactions.append((time.perf_counter() - start, len(queries)))
+            return responses
+
+        controller.connection.send_line_queries = timed
+
+    def queries(self) -> int:
+        return sum(count for _, count in self.transactions)
+
+
+def percentiles_ms(samples: list[float]) -> dict[str, float]:
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": cuts[49] * 1e3, "p99": cuts[98] * 1e3, "samples": len(samples)}
+
+
+async def poll(controller: WpiMicro4Controller, log: TransactionLog, duration: float):
+    scheduler = controller._poll_scheduler  # noqa: SLF001
+    tick = scheduler.tick
+    ticks = 0
+
+    async def counted_tick():
+        nonlocal ticks
+        ticks += 1
+        await tick()
+
+    scheduler.tick = counted_tick
+    # the periodic scan tasks FastCS would start after the initial sweep
+    _, scan_coros, _ = controller.create_api_and_tasks()
+    transactions, queries = len(log.transactions), log.queries()
+    cpu = time.process_time()
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(scan()) for scan in scan_coros]
+    await asyncio.sleep(duration)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    cpu = time.process_time() - cpu
+    elapsed = time.perf_counter() - start
+    scheduler.tick = tick
+    return {
+        "ticks": ticks,
+        "transactions": len(log.transactions) - transactions,
+        "queries_per_s": (log.queries() - queries) / elapsed,
+        "cpu_per_tick_ms": cpu / max(ticks, 1) * 1e3,
+    }
+
+
+async def saturate(
+    controller: WpiMicro4Controller, log: TransactionLog, duration: float
+) -> float:
+    queries = log.queries()
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        await controller.read_initial_values()
+    return (log.queries() - queries) / (time.perf_counter() - start)
+
+
+async def round_trips(controller: WpiMicro4Controller, count: int) -> list[float]:
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        await controller.connection.send_query("?G\r", 1)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def put_to_rbv(controller: WpiMicro4Controller, count: int) -> list[float]:
+    attr = controller.delivery_rate_l1  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType, reportUnknownVariableType]
+    updated = asyncio.Event()
+
+    async def on_update(value: float):
+        updated.set()
+
+    attr.add_on_update_callback(on_update)  # pyright: ignore[reportUnknownMemberType]
+    samples = []
+    for i in range(count):
+        updated.clear()
+        start = time.perf_counter()
+        await attr.put(1.0 + i % 2)  # pyright: ignore[reportUnknownMemberType]
+        await updated.wait()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def startup(url: str, args: argparse.Namespace) -> float:
+    start = time.perf_counter()
+    controller = WpiMicro4Controller(USBConnectionSettings(url, args.baudrate or 9600))
+    await controller.initialise()
+    controller.post_initialise()
+    await controller.connect()
+    elapsed = time.perf_counter() - start
+    await controller.disconnect()
+    return elapsed
+
+
+async def slider_settle(controller: WpiMicro4Controller, count: int) -> list[float]:
+    # puts of 20 setpoints 10 ms apart, timed from the last put until all have
+    # returned and the readback shows it
+    attr = controller.delivery_rate_l2  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType, reportUnknownVariableType]
+    samples = []
+    for i in range(count):
+        puts = []
+        for step in range(20):
+            puts.append(asyncio.create_task(attr.put(1.0 + step / 10 + i % 2)))  # pyright: ignore[reportUnknownArgumentType, reportUnknownMemberType]
+            await asyncio.sleep(0.01)
+        start = time.perf_counter()
+        await asyncio.gather(*puts)
+        assert attr.get() == 2.9 + i % 2  # pyright: ignore[reportUnknownMemberType]
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def run(url: str, args: argparse.Namespace) -> dict[str, Any]:
+    startup_s = await startup(url, args)
+    controller = WpiMicro4Controller(
+        USBConnectionSettings(url, args.baudrate or 9600), lines=(1, 2)
+    )
+    controller.post_initialise()
+    log = TransactionLog(controller)
+
+    await controller.connect()
+    results: dict[str, Any] = {
+        "baudrate": args.baudrate,
+        "startup_s": startup_s,
+        "once_sweep_s": log.transactions[0][0],
+        "poll": await poll(controller, log, args.duration),
+        "saturated_queries_per_s": await saturate(controller, log, args.duration),
+        "round_trip_ms": percentiles_ms(await round_trips(controller, args.samples)),
+        "put_to_rbv_ms": percentiles_ms(await put_to_rbv(controller, args.samples)),
+        "slider_settle_ms": percentiles_ms(
+            await slider_settle(controller, max(args.samples // 10, 2))
+        ),
+    }
+    await controller.connection.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--baudrate", type=int, default=9600, help="0 to not pace")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    simulator = subprocess.Popen(
+        [sys.executable, "-m", "fastcs_wpi_micro4", "simulator"]
+        + ["--baudrate", str(args.baudrate)],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        url = simulator.stdout.readline().split()[-1]  # pyright: ignore[reportOptionalMemberAccess]
+        results = asyncio.run(run(url, args))
+    finally:
+        simulator.terminate()
+        simulator.wait()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
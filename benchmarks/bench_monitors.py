@@ -0,0 +1,85 @@
+"""Monitor events published by a controller polling running pumps.
+
+Both lines of the simulated device, paced at 9600 baud, run at ``--rate`` nL/s
+while the controller's poll scheduler ticks for ``--duration`` seconds. Every
+attribute gets an on-update callback the way the EPICS transports subscribe, so each
+call is one monitor event sent to every client. Compared are the counter published
+on every change and with an absolute and a relative deadband. Prints JSON::
+
+    python benchmarks/bench_monitors.py --rate 2 --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+from typing import Any
+
+from fastcs.attributes import AttrR
+
+from fastcs_wpi_micro4.deadband import Deadband
+from fastcs_wpi_micro4.simulator import WpiMicro4Simulator
+from fastcs_wpi_micro4.usb_connection import USBConnectionSettings
+from fastcs_wpi_micro4.wpi_micro4_controller import WpiMicro4Controller
+
+DEADBANDS = {
+    "every_change": None,
+    "absolute_1nL": Deadband(absolute=1.0),
+    "relative_5%": Deadband(relative=0.05),
+}
+
+
+async def count_events(
+    deadband: Deadband | None, args: argparse.Namespace
+) -> dict[str, Any]:
+    simulator = WpiMicro4Simulator(baudrate=9600)
+    for line in simulator.lines:
+        line.rate_units = "nL/Sec"
+        line.rate = args.rate
+        line.target_volume = 1e6
+        line.motor_state = "Running"
+    server = await simulator.start_tcp()
+    url = f"socket://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+    deadbands = {} if deadband is None else {"volume_couner_l": deadband}
+    controller = WpiMicro4Controller(
+        USBConnectionSettings(url), lines=(1, 2), deadbands=deadbands
+    )
+    controller.post_initialise()
+    await controller.connect()
+
+    events = 0
+
+    async def on_update(value: Any):
+        nonlocal events
+        events += 1
+
+    for attr in controller.attributes.values():
+        if isinstance(attr, AttrR):
+            attr.add_on_update_callback(on_update)
+    loop = asyncio.get_running_loop()
+    end = loop.time() + args.duration
+    while loop.time() < end:
+        await asyncio.gather(controller.poll_once(), asyncio.sleep(0.1))
+
+    await controller.disconnect()
+    server.close()
+    return {
+        "events_per_s": events / args.duration,
+        "counter_replies_per_s": sum(controller.connection.statistics.reply_times["C"])
+        / args.duration,
+    }
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    return {name: await count_events(d, args) for name, d in DEADBANDS.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=2.0, help="nL/s of both lines")
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Micro-benchmark of reply parsing on the 0.5 s ?C/?G poll path.
+
+Compares ``protocol.parse_reply`` with the strip/replace chains the IO classes used
+before it, both reading their query details from the attribute's IORef as the IO
+``set`` methods do. Replies are an unchanged counter and state, as polled from a
+stopped pump, and a counter advancing on every poll, as from a running one. The two
+are timed in alternation, many times over, and the best per-reply time of each is
+printed as JSON, in nanoseconds::
+
+    python benchmarks/bench_parser.py
+"""
+
+import json
+import timeit
+from dataclasses import dataclass
+
+from fastcs.attributes import AttributeIORef, AttrR
+from fastcs.datatypes import Float, String
+
+from fastcs_wpi_micro4.protocol import parse_reply
+
+COUNTER_REPLY = ">Volume Counter = 12.1nL \n\rOK\n\r"
+STATE_REPLY = ">Motor State: Stopped\n\r>OK\n\r"
+ADVANCING_COUNTER_REPLIES = [
+    f">Volume Counter = {0.1 * i:.1f}nL \n\rOK\n\r" for i in range(10_000)
+]
+
+
+@dataclass
+class BenchIORef(AttributeIORef):
+    name: str
+    response_prefix: str  # only used by the legacy chains
+
+
+COUNTER = AttrR(Float(), io_ref=BenchIORef("C", ">Volume Counter = "))
+STATE = AttrR(String(), io_ref=BenchIORef("G", ">Motor State: "))
+
+
+def legacy_counter(response: str, attr: AttrR = COUNTER):
+    # the chain from WpiMicro4ControllerQueryIO.update
+    if f"{attr.io_ref.response_prefix}" in response:
+        value = response.strip(f"{attr.io_ref.response_prefix}" + " \n\rOK\n\r")
+        value = value.replace("\n\r>OK\n\r", "")
+        if "L" in value:
+            value = value[:-2]
+        return float(value)
+    raise Exception("Response doesn't much query")
+
+
+def legacy_state(response: str, attr: AttrR = STATE):
+    # the chain from WpiMicro4ControllerStateSettingIO.update
+    if f"{attr.io_ref.response_prefix}" in response:
+        value_without_prefix = response.replace(f"{attr.io_ref.response_prefix}", "")
+        value = value_without_prefix.replace("\n\r>OK\n\r", "")
+        value = value.replace("\n\rOK\n\r", "")
+        return value
+
+
+def parsed(response: str, attr: AttrR):
+    return parse_reply(attr.io_ref.name, response).value
+
+
+def best_ns(*stmts, number: int = 2_000, rounds: int = 300) -> list[float]:  # pyright: ignore[reportMissingParameterType, reportUnknownParameterType]
+    # in alternation, so a drift of the machine's speed affects every statement alike
+    timers = [timeit.Timer(stmt) for stmt in stmts]  # pyright: ignore[reportUnknownArgumentType, reportUnknownVariableType]
+    best = [float("inf")] * len(timers)
+    for _ in range(rounds):
+        for i, timer in enumerate(timers):
+            best[i] = min(best[i], timer.timeit(number) / number * 1e9)
+    return best
+
+
+def advancing(parse):  # pyright: ignore[reportMissingParameterType, reportUnknownParameterType]
+    replies = ADVANCING_COUNTER_REPLIES
+
+    def run():
+        for reply in replies:
+            parse(reply)
+
+    return run
+
+
+def compare(legacy, stmt, number: int = 2_000) -> dict[str, float]:  # pyright: ignore[reportMissingParameterType, reportUnknownParameterType]
+    legacy_ns, parse_reply_ns = best_ns(legacy, stmt, number=number)
+    return {"legacy_ns": legacy_ns, "parse_reply_ns": parse_reply_ns}
+
+
+def main():
+    replies = len(ADVANCING_COUNTER_REPLIES)
+    c_advancing = compare(
+        advancing(legacy_counter),
+        advancing(lambda r: parsed(r, COUNTER)),  # pyright: ignore[reportUnknownArgumentType, reportUnknownLambdaType]
+        number=1,
+    )
+    results = {
+        "C": compare(
+            lambda: legacy_counter(COUNTER_REPLY),
+            lambda: parsed(COUNTER_REPLY, COUNTER),
+        ),
+        "C_advancing": {name: ns / replies for name, ns in c_advancing.items()},
+        "G": compare(
+            lambda: legacy_state(STATE_REPLY),
+            lambda: parsed(STATE_REPLY, STATE),
+        ),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Startup time and memory of the controllers of a multi-pump IOC.
+
+Builds ``WpiMicro4MultiController`` with every line of every pump fitted, without
+connecting, runs ``post_initialise`` and ``create_api_and_tasks`` as FastCS does
+before serving, and reports the time taken and the memory allocated per pump and per
+attribute, plus the size of one IORef with its instance ``__dict__`` if it has one.
+Prints JSON::
+
+    python benchmarks/bench_startup.py --pumps 1 8 32
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+from fastcs.attributes import AttrR
+
+from fastcs_wpi_micro4.usb_connection import USBConnectionSettings
+from fastcs_wpi_micro4.wpi_micro4_controller import MAX_LINES
+from fastcs_wpi_micro4.wpi_micro4_multi_controller import WpiMicro4MultiController
+
+
+def build(pumps: int) -> WpiMicro4MultiController:
+    controller = WpiMicro4MultiController(
+        {f"P{i}": USBConnectionSettings(f"/dev/ttyUSB{i}") for i in range(pumps)}
+    )
+    for pump in controller.pumps.values():
+        pump._lines = tuple(range(1, MAX_LINES + 1))  # noqa: SLF001
+        pump.creat_setting_attributes(pump._lines)  # noqa: SLF001
+    controller.post_initialise()
+    controller.create_api_and_tasks()
+    return controller
+
+
+def io_ref_bytes(controller: WpiMicro4MultiController) -> dict[str, int]:
+    sizes: dict[str, int] = {}
+    pump = next(iter(controller.pumps.values()))
+    for attr in pump.attributes.values():
+        if not attr.has_io_ref() or type(attr.io_ref).__name__ in sizes:
+            continue
+        io_ref = attr.io_ref
+        size = sys.getsizeof(io_ref)
+        if hasattr(io_ref, "__dict__"):
+            size += sys.getsizeof(io_ref.__dict__)
+        sizes[type(io_ref).__name__] = size
+    return sizes
+
+
+def measure(pumps: int) -> dict[str, float]:
+    start = time.perf_counter()
+    build(pumps)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    controller = build(pumps)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    attrs = sum(
+        isinstance(attr, AttrR)
+        for pump in controller.pumps.values()
+        for attr in pump.attributes.values()
+    )
+    return {
+        "startup_ms": elapsed * 1e3,
+        "startup_ms_per_pump": elapsed * 1e3 / pumps,
+        "kib_per_pump": allocated / 1024 / pumps,
+        "bytes_per_attribute": allocated / (attrs or 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pumps", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    results = {f"pumps_{pumps}": measure(pumps) for pumps in args.pumps}
+    results["io_ref_bytes"] = io_ref_bytes(build(1))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 """Interface for ``python -m fastcs_kds_legato``."""
 
+import asyncio
 from pathlib import Path
 from typing import Optional
 
@@ -10,8 +11,13 @@ from fastcs.transports.epics.ca.transport import EpicsCATransport
 from fastcs.transports.epics.options import EpicsGUIOptions
 
 from fastcs_wpi_micro4 import __version__
+from fastcs_wpi_micro4.deadband import Deadband
+from fastcs_wpi_micro4.simulator import WpiMicro4Simulator
+from fastcs_wpi_micro4.traffic_capture import WpiMicro4TrafficReplay
 from fastcs_wpi_micro4.usb_connection import USBConnectionSettings
+from fastcs_wpi_micro4.volume_estimator import ESTIMATE_PERIOD
 from fastcs_wpi_micro4.wpi_micro4_controller import WpiMicro4Controller
+from fastcs_wpi_micro4.wpi_micro4_multi_controller import WpiMicro4MultiController
 
 __all__ = ["main"]
 
@@ -42,12 +48,61 @@ def main(
 
 
 @app.command()
-def ioc(pv_prefix: str = typer.Argument()):
+def ioc(
+    pv_prefix: str = typer.Argument(),
+    port: str = typer.Option(
+        "/dev/ttyUSB0", help="Serial port, or a pyserial URL e.g. socket://host:port"
+    ),
+    pump: list[str] = typer.Option(  # noqa: B008
+        [],
+        help="SUBPREFIX=PORT of one of several pumps served together, instead of "
+        "--port, e.g. --pump P1=/dev/ttyUSB0 --pump P2=/dev/ttyUSB1",
+    ),
+    capture: Optional[str] = typer.Option(  # noqa
+        None,
+        help="Append the serial traffic to this capture file, with --pump one file "
+        "per pump suffixed with its sub-prefix",
+    ),
+    deadband: list[str] = typer.Option(  # noqa: B008
+        [],
+        help="NAME=CHANGE publishing a polled float only once it changes by more, "
+        "absolute or with % relative, e.g. --deadband volume_couner_l=0.5 for every "
+        "line or --deadband volume_couner_l1=1%",
+    ),
+    estimate_period: float = typer.Option(
+        ESTIMATE_PERIOD,
+        help="Seconds between the updates of the volume estimates, extrapolated "
+        "between the polls of the counters",
+    ),
+):
     ui_path = OPI_PATH if OPI_PATH.is_dir() else Path.cwd()
 
-    connection_settings = USBConnectionSettings("/dev/ttyUSB0", 9600)
+    deadbands: dict[str, Deadband] = {}
+    for spec in deadband:
+        name, _, change = spec.partition("=")
+        try:
+            if change.endswith("%"):
+                deadbands[name] = Deadband(relative=float(change[:-1]) / 100)
+            else:
+                deadbands[name] = Deadband(absolute=float(change))
+        except ValueError:
+            raise typer.BadParameter(f"expected NAME=CHANGE, got {spec!r}") from None
+
     # Create a controller instance
-    controller = WpiMicro4Controller(connection_settings)
+    if pump:
+        pumps: dict[str, USBConnectionSettings] = {}
+        for spec in pump:
+            name, _, pump_port = spec.partition("=")
+            if not name or not pump_port:
+                raise typer.BadParameter(f"expected SUBPREFIX=PORT, got {spec!r}")
+            pump_capture = capture and f"{capture}.{name}"
+            pumps[name] = USBConnectionSettings(pump_port, 9600, pump_capture)
+        controller = WpiMicro4MultiController(pumps, deadbands, estimate_period)
+    else:
+        connection_settings = USBConnectionSettings(port, 9600, capture)
+        controller = WpiMicro4Controller(
+            connection_settings, deadbands=deadbands, estimate_period=estimate_period
+        )
 
     # IOC options
     options = EpicsCATransport(
@@ -64,5 +119,51 @@ def ioc(pv_prefix: str = typer.Argument()):
     launcher.run()  # type: ignore
 
 
+@app.command()
+def simulator(
+    tcp_port: int = typer.Option(
+        0, help="Serve on this TCP port, connect with socket://localhost:PORT"
+    ),
+    pty: bool = typer.Option(False, help="Serve on a pty instead of TCP"),
+    lines: int = typer.Option(2, help="Number of pump lines"),
+    baudrate: int = typer.Option(9600, help="Emulated baud rate, 0 to not pace"),
+):
+    """Run a simulated Micro4 controller to point the IOC's --port at."""
+    device = WpiMicro4Simulator(lines, baudrate or None)
+
+    async def serve():
+        if pty:
+            path, task = await device.start_pty()
+            typer.echo(f"Serving simulated Micro4 on {path}")
+            await task
+        else:
+            server = await device.start_tcp("localhost", tcp_port)
+            port = server.sockets[0].getsockname()[1]
+            typer.echo(f"Serving simulated Micro4 on socket://localhost:{port}")
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+@app.command()
+def replay(
+    capture: Path = typer.Argument(help="Capture file written by ioc --capture"),  # noqa: B008
+    tcp_port: int = typer.Option(
+        0, help="Serve on this TCP port, connect with socket://localhost:PORT"
+    ),
+    speed: float = typer.Option(1.0, help="Replay this many times faster"),
+):
+    """Stand in for the device with the replies of a captured session."""
+    device = WpiMicro4TrafficReplay.from_capture(capture, speed)
+
+    async def serve():
+        server = await device.start_tcp("localhost", tcp_port)
+        port = server.sockets[0].getsockname()[1]
+        typer.echo(f"Replaying {capture} on socket://localhost:{port}")
+        await server.serve_forever()
+
+    asyncio.run(serve())
+
+
 if __name__ == "__main__":
     app()
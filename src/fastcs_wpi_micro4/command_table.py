@@ -0,0 +1,169 @@
+"""Declarative table of the settings and readbacks of a Micro4 pump line.
+
+Every attribute of a line is generated from one ``LineAttributeSpec``: the letter of
+its ``?X`` query, which also picks its reply pattern in ``protocol.REPLY_TABLE``, the
+datatype, the IORef and so the IO handling it, the letter of its setting command or
+the map of PV values to the commands that set them, whether it is polled or read
+once by the initial sweep, and the deadband of a polled float.
+"""
+
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any
+
+from fastcs.attributes import AttributeIORef  # pyright: ignore[reportAttributeAccessIssue, reportUnknownVariableType]
+from fastcs.datatypes import DataType, Float, String
+
+from fastcs_wpi_micro4.deadband import Deadband
+from fastcs_wpi_micro4.wpi_micro4_controller_command_setting import (
+    WpiMicro4ControllerCommandSettingIORef,
+)
+from fastcs_wpi_micro4.wpi_micro4_controller_query import (
+    WpiMicro4ControllerQueryIORef,
+)
+from fastcs_wpi_micro4.wpi_micro4_controller_state_setting import (
+    WpiMicro4ControllerStateSettingIORef,
+)
+from fastcs_wpi_micro4.wpi_micro4_controller_type_setting import (
+    WpiMicro4ControllerTypeSettingIORef,
+)
+from fastcs_wpi_micro4.wpi_micro4_controller_value_setting import (
+    WpiMicro4ControllerValueSettingIORef,
+)
+
+
+@dataclass(frozen=True, slots=True)
+class PollClass:
+    period: float  # while the line's motor is running
+    idle_period: float  # while the line's motor is stopped or paused
+    priority: int = 0  # on a busy link, the lowest priorities are slowed down first
+
+
+COUNTER_POLL = PollClass(0.25, 5.0)  # the counter doesn't move while idle
+STATE_POLL = PollClass(0.5, 2.0, priority=1)  # to notice a start from the front panel
+
+# PV values of the string settings, mapped to the commands that set them
+DIRECTION_NAMES = {"Infuse": "I", "Withdraw": "W"}
+RATE_UNITS_NAMES = {"nL/Sec": "S", "nL/Min": "M"}
+MODE_NAMES = {"Non-Grouped": "N", "Grouped": "P", "Disabled": "D"}
+MOTOR_DRIVE_NAMES = {"Max Load Drive": "BT", "Smooth Drive": "BS"}
+COUNTER_MODE_NAMES = {"Delivered Volume": "EN", "Remaining Volume": "EI"}
+STATE_NAMES = {"Run": "G", "Stop": "H", "Pause": "U", "Kill": "Z"}
+SYRINGE_NAMES = {
+    "Type A": "11",
+    "Type B": "12",
+    "Type C": "13",
+    "Type 1": "1",
+    "Type 2": "2",
+    "Type 3": "3",
+    "Type 4": "4",
+    "Type 5": "5",
+    "Type 6": "6",
+    "Type 7": "7",
+    "Type 8": "8",
+    "Type 9": "9",
+    # "Type 10": "10" # could ignore this type
+    # special syrynge not used at Diamond
+}
+
+
+@dataclass(frozen=True, slots=True)
+class LineAttributeSpec:
+    name: str  # of the attribute, the line number is appended
+    query: str  # letter of the ?X query
+    datatype: DataType[Any]  # shared by the attributes of every line
+    io_ref: type[AttributeIORef]
+    command: str | None = None  # letter of the setting command
+    names: Mapping[str, str] | None = None  # PV values to the commands setting them
+    poll: PollClass | None = None  # None reads the value once, by the initial sweep
+    deadband: Deadband | None = None  # of a polled float, None publishes any change
+
+    @property
+    def writable(self) -> bool:
+        return self.command is not None or self.names is not None
+
+    def make_io_ref(self, line: int, **extra: Any) -> AttributeIORef:  # pyright: ignore[reportUnknownParameterType]
+        kwargs: dict[str, Any] = {}
+        if self.command is not None:
+            kwargs["command"] = self.command
+        if self.names is not None:
+            kwargs["names"] = self.names
+        if self.poll is not None:
+            kwargs["poll_period"] = self.poll.period
+            kwargs["idle_poll_period"] = self.poll.idle_period
+        if self.deadband is not None:
+            kwargs["deadband"] = self.deadband
+        kwargs.update(extra)
+        return self.io_ref(self.query, line, **kwargs)  # pyright: ignore[reportUnknownMemberType]
+
+
+_SETTING = Float(prec=1)
+_TEXT = String()
+
+# in the order the attributes of a line are created and read
+LINE_ATTRIBUTES = (
+    LineAttributeSpec(
+        "volume_l", "V", _SETTING, WpiMicro4ControllerValueSettingIORef, command="V"
+    ),
+    LineAttributeSpec(
+        "delivery_rate_l",
+        "R",
+        _SETTING,
+        WpiMicro4ControllerValueSettingIORef,
+        command="R",
+    ),
+    LineAttributeSpec(
+        "pump_direction_l",
+        "D",
+        _TEXT,
+        WpiMicro4ControllerCommandSettingIORef,
+        names=DIRECTION_NAMES,
+    ),
+    LineAttributeSpec(
+        "rate_units_l",
+        "U",
+        _TEXT,
+        WpiMicro4ControllerCommandSettingIORef,
+        names=RATE_UNITS_NAMES,
+    ),
+    LineAttributeSpec(
+        "mode_l", "M", _TEXT, WpiMicro4ControllerCommandSettingIORef, names=MODE_NAMES
+    ),
+    LineAttributeSpec(
+        "motor_drive_l",
+        "B",
+        _TEXT,
+        WpiMicro4ControllerCommandSettingIORef,
+        names=MOTOR_DRIVE_NAMES,
+    ),
+    LineAttributeSpec(
+        "volume_counter_mode_l",
+        "E",
+        _TEXT,
+        WpiMicro4ControllerCommandSettingIORef,
+        names=COUNTER_MODE_NAMES,
+    ),
+    LineAttributeSpec(
+        "volume_couner_l",
+        "C",
+        Float(),
+        WpiMicro4ControllerQueryIORef,
+        poll=COUNTER_POLL,
+    ),
+    LineAttributeSpec(
+        "pump_state_l",
+        "G",
+        _TEXT,
+        WpiMicro4ControllerStateSettingIORef,
+        names=STATE_NAMES,
+        poll=STATE_POLL,
+    ),
+    LineAttributeSpec(
+        "type_l",
+        "S",
+        _TEXT,
+        WpiMicro4ControllerTypeSettingIORef,
+        command="T",
+        names=SYRINGE_NAMES,
+    ),
+)
@@ -0,0 +1,83 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+
+from fastcs.attributes import AttrR
+from fastcs.datatypes import Float, Int, String
+from fastcs.logging import logger
+
+from fastcs_wpi_micro4.usb_connection import USBConnection, USBConnectionSettings
+
+# delay before the first reconnect attempt, doubled after every failed one
+RECONNECT_BACKOFF = 0.5
+RECONNECT_BACKOFF_MAX = 30.0
+
+
+class WpiMicro4ConnectionSupervisor:
+    """Reconnects the USB connection after the serial link is lost.
+
+    Once the link is back every attribute is refreshed in one batched sweep, so the
+    PVs don't show values from before the outage. The connection status, the
+    number of reconnects and the downtime of the last outage are published as
+    attributes.
+    """
+
+    def __init__(
+        self,
+        connection: USBConnection,
+        settings: USBConnectionSettings,
+        refresh: Callable[[], Awaitable[None]],
+        backoff: float = RECONNECT_BACKOFF,
+        backoff_max: float = RECONNECT_BACKOFF_MAX,
+    ):
+        self._connection = connection
+        self._settings = settings
+        self._refresh = refresh
+        self._backoff = backoff
+        self._backoff_max = backoff_max
+        self._task: asyncio.Task[None] | None = None
+
+        self.status = AttrR(String(), initial_value="Disconnected")
+        self.reconnect_count = AttrR(Int())
+        self.downtime = AttrR(Float(units="s", prec=2))  # of the last outage
+
+    @property
+    def connected(self) -> bool:
+        """The link is up, and has been refreshed if it was lost."""
+        return self.status.get() == "Connected"
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._supervise())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _supervise(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            lost_at = loop.time()
+            # started without a link when the first connect failed
+            if self._connection.connected:
+                await self.status.update("Connected")  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+                await self._connection.link_lost.wait()
+                lost_at = loop.time()
+            await self.status.update("Disconnected")  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+            await self._reconnect()
+            await self.reconnect_count.update(self.reconnect_count.get() + 1)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+            await self.downtime.update(loop.time() - lost_at)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+
+    async def _reconnect(self) -> None:
+        backoff = self._backoff
+        while True:
+            await asyncio.sleep(backoff)
+            try:
+                await self._connection.connect(self._settings)
+                await self._refresh()
+                return
+            except Exception as e:
+                # whatever failed, the supervisor keeps trying
+                logger.warning("Reconnect failed", error=str(e))
+            backoff = min(backoff * 2, self._backoff_max)
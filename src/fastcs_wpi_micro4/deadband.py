@@ -0,0 +1,24 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class Deadband:
+    """Smallest change of a polled float readback that is published.
+
+    A change is published once it is larger than ``absolute`` or than ``relative``
+    times the published value, whichever is larger. The default publishes any change.
+    """
+
+    absolute: float = 0.0
+    relative: float = 0.0  # fraction of the published value
+
+    def exceeded(self, published: float, value: float) -> bool:
+        """
+        >>> Deadband(absolute=0.5).exceeded(10.0, 10.4)
+        False
+        >>> Deadband(absolute=0.5, relative=0.01).exceeded(100.0, 101.1)
+        True
+        """
+        return abs(value - published) > max(
+            self.absolute, self.relative * abs(published)
+        )
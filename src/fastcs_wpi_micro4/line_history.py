@@ -0,0 +1,97 @@
+"""Recent history of the volume counter and motor state of a line, and its flow rate.
+
+Every counter reading is kept in a fixed size ring of numpy arrays, with the loop
+time it was read at and the motor state last read, so the memory used doesn't grow
+however long the IOC runs. The measured flow rate is the least squares slope of the
+readings of the last ``RATE_WINDOW`` seconds the motor has been running. The counter
+is taken in nL from its companion in ``units``, so the rate is in nL/s, to be
+compared with the companion of the rate setpoint. Both are derived from the polled
+readings, without any query of their own.
+"""
+
+import asyncio
+from collections.abc import Callable
+
+import numpy as np
+from fastcs.attributes import AttrR
+from fastcs.datatypes import Float, Waveform
+
+# counter readings kept, 64 s of a running line polled every 0.25 s
+HISTORY_LENGTH = 256
+# seconds of readings the flow rate is fitted to
+RATE_WINDOW = 5.0
+# period the history waveforms are published at
+HISTORY_PERIOD = 1.0
+# codes of the motor states in the state history, others are -1
+MOTOR_STATES = ("Stopped", "Running", "Paused")
+RUNNING = MOTOR_STATES.index("Running")
+
+
+class LineHistory:
+    def __init__(
+        self,
+        counter: AttrR,  # pyright: ignore[reportMissingTypeArgument, reportUnknownParameterType]
+        motor_state: AttrR,  # pyright: ignore[reportMissingTypeArgument, reportUnknownParameterType]
+        length: int = HISTORY_LENGTH,
+        read_time: Callable[[], float | None] | None = None,
+    ):
+        self._motor_state = motor_state  # pyright: ignore[reportUnknownMemberType]
+        self._times = np.full(length, np.nan)
+        self._volumes = np.full(length, np.nan)
+        self._states = np.full(length, -1, dtype=np.int8)
+        self._next = 0  # index the next reading is written to
+        self._count = 0
+
+        self.rate = AttrR(Float(units="nL/s", prec=4))  # measured
+        # oldest first, the times in seconds before the last publish
+        self.times = AttrR(Waveform(np.float64, shape=(length,)))
+        self.volumes = AttrR(Waveform(np.float64, shape=(length,)))
+        self.states = AttrR(Waveform(np.int8, shape=(length,)))
+
+        async def on_reading(value: float):
+            # the time the device read the counter at, rather than now, if known
+            at = read_time and read_time()
+            self.record(value, asyncio.get_running_loop().time() if at is None else at)
+            await self.rate.update(self.flow_rate())  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+
+        counter.add_on_update_callback(on_reading, always=True)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+
+    def record(self, volume: float, at: float) -> None:
+        state = self._motor_state.get()  # pyright: ignore[reportUnknownMemberType, reportUnknownVariableType]
+        index = self._next
+        self._times[index] = at
+        self._volumes[index] = volume
+        self._states[index] = MOTOR_STATES.index(state) if state in MOTOR_STATES else -1
+        self._next = (index + 1) % len(self._times)
+        self._count = min(self._count + 1, len(self._times))
+
+    def history(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Times, volumes and motor state codes of the readings, oldest first."""
+        order = np.roll(np.arange(len(self._times)), -self._next)
+        return self._times[order], self._volumes[order], self._states[order]
+
+    def flow_rate(self) -> float:
+        """Slope in nL/s of the readings of the current run, over ``RATE_WINDOW``."""
+        if self._count < 2:
+            return 0.0
+        times, volumes, states = (column[-self._count :] for column in self.history())
+        if states[-1] != RUNNING:
+            return 0.0
+        # the readings of the current run only, the counter may restart with it
+        stopped = np.flatnonzero(states != RUNNING)
+        start = stopped[-1] + 1 if len(stopped) else 0
+        in_window = times[start:] >= times[-1] - RATE_WINDOW
+        times, volumes = times[start:][in_window], volumes[start:][in_window]
+        if len(times) < 2:
+            return 0.0
+        dt = times - times.mean()
+        spread = np.dot(dt, dt)
+        if spread == 0:
+            return 0.0
+        return abs(float(np.dot(dt, volumes - volumes.mean()) / spread))
+
+    async def publish(self, now: float) -> None:
+        times, volumes, states = self.history()
+        await self.times.update(times - now)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        await self.volumes.update(volumes)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        await self.states.update(states)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
@@ -0,0 +1,110 @@
+"""Budget of the serial link's bytes per second spent on polling.
+
+At 9600 baud, 8N1, the link carries 960 bytes a second and every exchange is sent
+and answered in turn, so the bytes of a query and of its reply both take link time.
+The cost of each ``?X`` query is taken from its sample reply in
+``expected_replies.py``, padded for values with more digits. Every poll is charged a
+line switch too, when more than one line is polled, which is an upper bound since
+the queries of a line due together share one switch.
+
+When the poll plan would use more than ``max_utilisation`` of the link, the poll
+periods are stretched, those of the lowest priority first, so writes are left the
+rest of it.
+"""
+
+import ast
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastcs.attributes import AttrR
+from fastcs.datatypes import Float
+
+# start, data and stop bits of a byte
+BITS_PER_BYTE = 10
+# share of the link the polls may use, the rest is left to writes
+MAX_POLL_UTILISATION = 0.7
+# stretch of one priority, before every priority is stretched alike
+MAX_STRETCH = 4.0
+# extra digits a reply may have over its sample, e.g. a counter of 12345.6nL
+NUMBER_PADDING = 4
+# "L1\r" answered by "L1\n\r>OK\n\r"
+LINE_SWITCH_BYTES = 3 + 8
+
+
+def _sample_replies() -> dict[str, str]:
+    """Sample reply of every query letter, e.g. ``{"C": "?C>Volume Counter..."}``."""
+    source = Path(__file__).with_name("expected_replies.py").read_text()
+    return {
+        node.value.value[1]: node.value.value
+        for node in ast.parse(source).body
+        if isinstance(node, ast.Expr)
+        and isinstance(node.value, ast.Constant)
+        and isinstance(node.value.value, str)
+    }
+
+
+def _reply_bytes(reply: str) -> int:
+    padding = NUMBER_PADDING if any(c.isdigit() for c in reply) else 0
+    return len(reply) + padding
+
+
+# bytes of each query and its reply
+EXCHANGE_BYTES = {
+    letter: len(f"?{letter}\r") + _reply_bytes(reply)
+    for letter, reply in _sample_replies().items()
+}
+
+
+@dataclass(slots=True)
+class PlannedPoll:
+    line: int
+    query: str  # letter of the ?X query
+    period: float  # as planned, before any stretch
+    priority: int  # higher priorities are stretched last
+
+
+class LinkBudget:
+    """Fits the poll periods into the share of the link left after the writes."""
+
+    def __init__(
+        self, baudrate: int = 9600, max_utilisation: float = MAX_POLL_UTILISATION
+    ):
+        self.bytes_per_second = baudrate / BITS_PER_BYTE
+        self.max_utilisation = max_utilisation
+        # of the fitted plan, as a percentage of the link
+        self.utilisation = AttrR(Float(units="%", prec=1))
+
+    def fit(self, polls: Sequence[PlannedPoll]) -> tuple[dict[int, float], float]:
+        """Stretch of the periods of each priority, and the utilisation with them.
+
+        The priorities are stretched from the lowest, each up to ``MAX_STRETCH``,
+        until the polls fit in ``max_utilisation``. If they still don't, every
+        period is stretched alike.
+        """
+        switch = LINE_SWITCH_BYTES if len({poll.line for poll in polls}) > 1 else 0
+        loads: dict[int, float] = {}
+        for poll in polls:
+            rate = (EXCHANGE_BYTES[poll.query] + switch) / poll.period
+            loads[poll.priority] = (
+                loads.get(poll.priority, 0.0) + rate / self.bytes_per_second
+            )
+
+        stretches = dict.fromkeys(loads, 1.0)
+        utilisation = sum(loads.values())
+        for priority in sorted(loads):
+            excess = utilisation - self.max_utilisation
+            if excess <= 0:
+                break
+            load = loads[priority]
+            stretch = min(load / max(load - excess, 1e-9), MAX_STRETCH)
+            stretches[priority] = stretch
+            utilisation -= load - load / stretch
+        if utilisation > self.max_utilisation:
+            scale = utilisation / self.max_utilisation
+            stretches = {p: stretch * scale for p, stretch in stretches.items()}
+            utilisation = self.max_utilisation
+        return stretches, utilisation
+
+    async def publish(self, utilisation: float) -> None:
+        await self.utilisation.update(round(utilisation * 100, 1))  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
@@ -0,0 +1,59 @@
+"""Counters of the traffic over the serial link, cheap enough to always keep.
+
+Every reply costs a ``perf_counter`` and a bisect into the histogram of its kind, the
+rest are integer and float additions.
+"""
+
+from bisect import bisect_left
+from dataclasses import dataclass, field
+
+# upper edges in seconds of the reply time histogram buckets, plus one overflow bucket
+REPLY_TIME_BUCKETS = (0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+
+def message_kind(message: str) -> str:
+    """Histogram a message's replies are counted in.
+
+    >>> [message_kind(m) for m in ("?C\\r", "L2\\r", "V200.6\\r", "G\\r")]
+    ['C', 'L', 'W', 'W']
+    """
+    if message.startswith("?"):
+        return message[1:2]
+    return "L" if message.startswith("L") else "W"
+
+
+@dataclass
+class LinkStatistics:
+    # reply time, since the previous reply or the write, by message_kind
+    reply_times: dict[str, list[int]] = field(default_factory=dict[str, list[int]])
+    transactions: int = 0
+    pending: int = 0  # transactions waiting for the link or using it
+    pending_max: int = 0
+    coalesced_polls: int = 0  # periodic reads answered by an identical waiting one
+    dropped_polls: int = 0  # periodic reads dropped with the link backed up
+    lock_wait_total: float = 0.0
+    lock_wait_max: float = 0.0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    error_replies: int = 0
+    timeouts: int = 0
+    misaligned: int = 0
+    link_losses: int = 0
+
+    def record_lock_wait(self, wait: float) -> None:
+        self.transactions += 1
+        self.lock_wait_total += wait
+        if wait > self.lock_wait_max:
+            self.lock_wait_max = wait
+
+    def record_reply(self, message: str, reply_time: float, size: int) -> None:
+        kind = message_kind(message)
+        histogram = self.reply_times.get(kind)
+        if histogram is None:
+            histogram = self.reply_times[kind] = [0] * (len(REPLY_TIME_BUCKETS) + 1)
+        histogram[bisect_left(REPLY_TIME_BUCKETS, reply_time)] += 1
+        self.bytes_received += size
+
+    @property
+    def lock_wait_mean(self) -> float:
+        return self.lock_wait_total / self.transactions if self.transactions else 0.0
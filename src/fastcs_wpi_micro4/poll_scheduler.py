@@ -0,0 +1,197 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any
+
+from fastcs.attributes import AttrR
+from fastcs.logging import logger
+
+from fastcs_wpi_micro4.link_budget import LinkBudget, PlannedPoll
+from fastcs_wpi_micro4.protocol import UnexpectedReplyError
+from fastcs_wpi_micro4.usb_connection import (
+    DisconnectedError,
+    PollDroppedError,
+    ResponseError,
+    USBConnection,
+)
+
+# base cadence of the scheduler, poll periods are effectively rounded up to ticks
+POLL_TICK = 0.1
+# motor states of a line that isn't moving, anything else is polled as running
+IDLE_MOTOR_STATES = frozenset({"Stopped", "Paused"})
+# polls at the tick cadence after a state write, to catch the motor starting/stopping
+BURST_POLLS = 3
+
+
+@dataclass
+class PollEntry:
+    attr: AttrR  # pyright: ignore[reportMissingTypeArgument]
+    io: Any  # IO providing query_message(attr) and set(response, attr)
+    period: float  # while the line's motor is running
+    idle_period: float  # while the line's motor is stopped or paused
+    priority: int = 0  # the link budget stretches the lowest priorities first
+    stretch: float = field(default=1.0)  # of the period, to fit the link budget
+    next_due: float = field(default=0.0)
+    burst: int = field(default=0)  # polls left at the tick cadence
+    unexpected: bool = field(default=False)  # the last reply couldn't be parsed
+
+    @property
+    def line(self) -> int:
+        return self.attr.io_ref.line_num  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType, reportUnknownVariableType]
+
+
+class WpiMicro4PollScheduler:
+    """Owns the poll cadence of every periodically read attribute of a controller.
+
+    Each tick the queries of all due attributes, of every line, are sent as one
+    ordered, pipelined transaction and the replies are fanned back out to the
+    attributes, instead of every attribute running its own scan loop against the
+    serial lock. The connection groups the queries per line so each line is switched
+    to at most once a tick.
+
+    The poll period of an attribute follows the last motor state read for its line,
+    so idle pumps leave the link to the running ones. The periods are stretched when
+    the polls of the fitted lines would oversubscribe the link budget.
+    """
+
+    def __init__(self, connection: USBConnection, budget: LinkBudget | None = None):
+        self._connection = connection
+        self._budget = budget or LinkBudget()
+        self._entries: list[PollEntry] = []
+        self._idle_lines: set[int] = set()
+        self._utilisation = 0.0  # of the link by the fitted plan
+        # the last sweep failed, its failures are logged when they start and end
+        self._failing = False
+
+    def add(
+        self,
+        attr: AttrR,  # pyright: ignore[reportMissingTypeArgument, reportUnknownParameterType]
+        io: Any,
+        period: float,
+        idle_period: float | None = None,
+        priority: int = 0,
+    ) -> None:
+        idle_period = period if idle_period is None else idle_period
+        self._entries.append(PollEntry(attr, io, period, idle_period, priority))
+
+    def watch_motor_state(self, line: int, attr: AttrR) -> None:  # pyright: ignore[reportMissingTypeArgument, reportUnknownParameterType]
+        """Adapt the poll periods of ``line`` to the motor state read into ``attr``."""
+
+        async def on_update(state: str):
+            self.set_motor_state(line, state)
+
+        attr.add_on_update_callback(on_update)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+
+    def set_motor_state(self, line: int, state: str) -> None:
+        if state in IDLE_MOTOR_STATES:
+            if line not in self._idle_lines:
+                self._idle_lines.add(line)
+                self.fit_budget()
+        elif line in self._idle_lines:
+            self._idle_lines.discard(line)
+            self.fit_budget()
+            # started outside a state write, catch up on the counter now
+            for entry in self._entries:
+                if entry.line == line:
+                    entry.next_due = 0.0
+
+    def burst(self, line: int) -> None:
+        """Poll ``line`` now and for the next few ticks, e.g. after a Run/Stop."""
+        for entry in self._entries:
+            if entry.line == line:
+                entry.next_due = 0.0
+                entry.burst = BURST_POLLS
+
+    def base_period(self, entry: PollEntry) -> float:
+        return entry.idle_period if entry.line in self._idle_lines else entry.period
+
+    def period(self, entry: PollEntry) -> float:
+        if entry.burst:
+            return POLL_TICK
+        return self.base_period(entry) * entry.stretch
+
+    def fit_budget(self) -> None:
+        """Stretch the poll periods of the fitted lines to fit the link budget."""
+        fitted = self._connection.fitted_lines
+        entries = [
+            entry for entry in self._entries if fitted is None or entry.line in fitted
+        ]
+        stretches, self._utilisation = self._budget.fit(
+            [
+                PlannedPoll(
+                    entry.line,
+                    entry.io.query_message(entry.attr)[1:2],  # pyright: ignore[reportUnknownMemberType]
+                    self.base_period(entry),
+                    entry.priority,
+                )
+                for entry in entries
+            ]
+        )
+        for entry in entries:
+            entry.stretch = stretches[entry.priority]
+
+    def mark_read(self, now: float) -> None:
+        """Make every entry due a period after ``now``, when a sweep has read them."""
+        # the lines fitted are probed before every sweep
+        self.fit_budget()
+        for entry in self._entries:
+            entry.next_due = now + self.period(entry)
+
+    def attrs(self) -> list[AttrR]:  # pyright: ignore[reportMissingTypeArgument, reportUnknownParameterType]
+        return [entry.attr for entry in self._entries]  # pyright: ignore[reportUnknownMemberType, reportUnknownVariableType]
+
+    def due_entries(self, now: float) -> list[PollEntry]:
+        # lines found not fitted when the link was last (re)connected are skipped
+        fitted = self._connection.fitted_lines
+        return [
+            entry
+            for entry in self._entries
+            if entry.next_due <= now and (fitted is None or entry.line in fitted)
+        ]
+
+    async def tick(self) -> None:
+        await self._budget.publish(self._utilisation)
+        now = asyncio.get_running_loop().time()
+        due = self.due_entries(now)
+        if not due:
+            return
+
+        responses: list[str | None]
+        try:
+            responses = await self._connection.send_line_queries(  # pyright: ignore[reportAssignmentType]
+                [
+                    (entry.line, entry.io.query_message(entry.attr))  # pyright: ignore[reportUnknownMemberType]
+                    for entry in due
+                ],
+                periodic=True,
+            )
+        except PollDroppedError:
+            # the link is backed up, these are read again a period later
+            responses = [None] * len(due)
+        except (ResponseError, DisconnectedError) as e:
+            # the link has been resynchronised or is being reconnected, the entries
+            # keep their cadence
+            if not self._failing:
+                logger.warning("Polls failing", error=str(e))
+                self._failing = True
+            responses = [None] * len(due)
+        else:
+            if self._failing:
+                logger.info("Polls answered again")
+                self._failing = False
+        for entry, response in zip(due, responses, strict=True):
+            entry.burst = max(entry.burst - 1, 0)
+            period = self.period(entry)
+            # keep the original phase so entries due together stay together
+            entry.next_due += period
+            if entry.next_due <= now:
+                entry.next_due = now + period
+            if response is None:
+                continue
+            try:
+                await entry.io.set(response, entry.attr)  # pyright: ignore[reportUnknownMemberType]
+            except UnexpectedReplyError as e:
+                if not entry.unexpected:
+                    logger.warning("Unexpected poll reply", error=str(e))
+                entry.unexpected = True
+            else:
+                entry.unexpected = False
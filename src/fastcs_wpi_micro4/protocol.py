@@ -0,0 +1,145 @@
+"""Parsing of the Micro4 replies to its ``?X`` queries.
+
+Every reply format listed in ``expected_replies.py`` has one entry in the table, so
+a reply is validated and split into its typed value and unit in a single pass. Most
+replies carry their value after a fixed prefix and are split on it with string
+methods, which cost less than a pattern on the poll path. The syringe reply is
+matched with a precompiled pattern. Replies are accepted with or without the echoed
+``?X`` query in front.
+
+The parsed replies are named tuples, so the IOs they are handed to can't change them.
+"""
+
+import re
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import NamedTuple
+
+# reply to an unknown or malformed command, the firmware answers ? without an OK
+ERROR_REPLY = "?\n\r"
+
+
+class UnexpectedReplyError(Exception):
+    """Raised if a reply doesn't match the format expected for its query."""
+
+    pass
+
+
+class NumberReply(NamedTuple):
+    value: float
+    unit: str | None = None  # volumes carry nL/uL, rates are in the ?U units
+
+
+class TextReply(NamedTuple):
+    value: str  # enumerated state, e.g. "Stopped", "nL/Min" or "Smooth Drive"
+
+
+class SyringeReply(NamedTuple):
+    value: str  # syringe type, e.g. "Type A"
+    volume: float
+    volume_unit: str
+    length: float
+
+
+Reply = NumberReply | TextReply | SyringeReply
+
+# builds a reply from the tuple of its fields, skipping the argument handling of
+# the named tuple's own __new__, which takes twice as long
+_new_reply = tuple.__new__  # pyright: ignore[reportUnknownMemberType, reportUnknownVariableType]
+
+_NUMBER = r"([-+]?\d*\.?\d+)"
+# by the letter in front of the L of a volume
+_UNITS = {"n": "nL", "u": "uL"}
+
+
+def _quantity(prefix: str, response: str) -> NumberReply:
+    # from the prefix to the unit, e.g. "12.1nL ", or to the space after the number
+    number, unit_end, _ = response.partition(prefix)[2].partition("L ")
+    if unit_end:
+        return _new_reply(NumberReply, (float(number[:-1]), _UNITS[number[-1]]))
+    return _new_reply(NumberReply, (float(number.partition(" ")[0]), None))
+
+
+def _text(prefix: str, response: str) -> TextReply:
+    # from the prefix to the line end
+    text = response.partition(prefix)[2].partition("\n")[0].rstrip(" \r")
+    if not text or ">" in text:
+        raise ValueError(text)
+    return _new_reply(TextReply, (text,))
+
+
+_SYRINGE = re.compile(r">([^,\r\n>]+), *" + _NUMBER + r" *([nu]L), *" + _NUMBER)
+
+
+def _syringe(prefix: str, response: str) -> SyringeReply:
+    match = _SYRINGE.search(response)
+    if match is None:
+        raise ValueError(response)
+    syringe_type, volume, volume_unit, length = match.groups()
+    return SyringeReply(syringe_type, float(volume), volume_unit, float(length))
+
+
+@dataclass(frozen=True, slots=True)
+class ReplyFormat:
+    # raises ValueError, KeyError or IndexError if the reply doesn't match
+    parse: Callable[[str, str], Reply]
+    prefix: str = ""  # of the value, passed to parse
+
+
+REPLY_TABLE: dict[str, ReplyFormat] = {
+    "V": ReplyFormat(_quantity, "Target Volume = "),
+    "R": ReplyFormat(_quantity, "Rate = "),
+    "C": ReplyFormat(_quantity, "Volume Counter = "),
+    "D": ReplyFormat(_text, "Direction: "),
+    "G": ReplyFormat(_text, "Motor State: "),
+    "U": ReplyFormat(_text, "Rate Units: "),
+    "M": ReplyFormat(_text, "Mode: "),
+    "B": ReplyFormat(_text, ">"),
+    "E": ReplyFormat(_text, ">"),
+    "S": ReplyFormat(_syringe),
+}
+
+
+def parse_reply(letter: str, response: str) -> Reply:
+    """Parse the reply to the ``?{letter}`` query.
+
+    >>> parse_reply("C", "?C>Volume Counter = 12.1nL \\n\\rOK\\n\\r")
+    NumberReply(value=12.1, unit='nL')
+    >>> parse_reply("G", "?G>Motor State: Stopped\\n\\r>OK\\n\\r")
+    TextReply(value='Stopped')
+    >>> parse_reply("S", "?S>Type A, 10.0uL, 60.0\\n\\r>OK\\n\\r")
+    SyringeReply(value='Type A', volume=10.0, volume_unit='uL', length=60.0)
+    """
+    reply_format = REPLY_TABLE[letter]
+    try:
+        return reply_format.parse(reply_format.prefix, response)
+    except (ValueError, KeyError, IndexError):
+        raise UnexpectedReplyError(
+            f"Response {response!r} doesn't match ?{letter}"
+        ) from None
+
+
+# command -> query letter whose reply format the firmware echoes back for it, so
+# the readback can be taken from the command's own reply. Commands missing here
+# only answer OK and are read back with a query.
+COMMAND_ECHOES: dict[str, str] = {
+    "V": "V",  # V200.6 -> Target Volume = 200.6nL
+    "R": "R",  # R0.7 -> Rate = 0.7
+}
+
+
+def parse_echo(command: str, response: str) -> Reply | None:
+    """Parse the readback echoed in the reply to ``command``, if there is one.
+
+    >>> parse_echo("V", "V200.6>Target Volume = 200.6nL \\n\\rOK\\n\\r")
+    NumberReply(value=200.6, unit='nL')
+    >>> parse_echo("I", "I\\n\\r>OK\\n\\r") is None
+    True
+    """
+    letter = COMMAND_ECHOES.get(command)
+    if letter is None:
+        return None
+    try:
+        return parse_reply(letter, response)
+    except UnexpectedReplyError:
+        return None
@@ -0,0 +1,248 @@
+"""Asyncio simulator of a Micro4 controller driving UMP3 pumps.
+
+It answers the commands and ``?X`` queries sent by the driver in the reply formats
+listed in ``expected_replies.py``, for any number of lines. Each line keeps its own
+target volume, rate, direction, units, mode and syringe, and a running line advances
+its volume counter at the set rate until the target volume has been delivered.
+
+The simulator is served over TCP, reachable with the ``socket://host:port`` URL, or
+over a pty, reachable with the path of the pty's slave. Either can be passed as the
+port of ``USBConnectionSettings`` without changing ``USBConnection``. With a baud rate
+set, both directions of the link are paced at the byte time of a serial line with 10
+bits a byte (start, 8 data bits and stop), e.g. ~1.04 ms a byte at 9600 baud.
+"""
+
+import asyncio
+import os
+import tty
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+from fastcs_wpi_micro4.protocol import ERROR_REPLY
+
+# index of the syringe types of the T command, length of the syringe in mm
+SYRINGE_TYPES: dict[str, tuple[str, float, str, float]] = {
+    "1": ("Type 1", 0.5, "uL", 60.0),
+    "2": ("Type 2", 1.0, "uL", 60.0),
+    "3": ("Type 3", 2.0, "uL", 60.0),
+    "4": ("Type 4", 5.0, "uL", 60.0),
+    "5": ("Type 5", 10.0, "uL", 60.0),
+    "6": ("Type 6", 25.0, "uL", 60.0),
+    "7": ("Type 7", 50.0, "uL", 60.0),
+    "8": ("Type 8", 100.0, "uL", 60.0),
+    "9": ("Type 9", 250.0, "uL", 60.0),
+    "11": ("Type A", 10.0, "uL", 60.0),
+    "12": ("Type B", 25.0, "uL", 60.0),
+    "13": ("Type C", 50.0, "uL", 60.0),
+}
+
+
+@dataclass
+class SimulatedLine:
+    """State of the pump on one line of the controller."""
+
+    target_volume: float = 200.6  # nL
+    rate: float = 0.7  # in rate_units
+    direction: str = "Infuse"
+    rate_units: str = "nL/Min"
+    mode: str = "Non-Grouped"
+    drive: str = "Smooth Drive"
+    counter_mode: str = "Delivered Volume"
+    syringe: str = "11"
+    motor_state: str = "Stopped"
+    counter: float = 0.0  # nL delivered
+    # loop time the counter was last brought up to date, None until the first advance
+    _updated: float | None = field(default=None, repr=False)
+
+    def advance(self, now: float) -> None:
+        """Advance the volume counter of a running pump up to ``now``."""
+        # a line created before the loop started counts from its first advance
+        elapsed = 0.0 if self._updated is None else now - self._updated
+        self._updated = now
+        if self.motor_state != "Running":
+            return
+        per_second = self.rate / 60 if self.rate_units == "nL/Min" else self.rate
+        self.counter = min(self.counter + per_second * elapsed, self.target_volume)
+        if self.counter >= self.target_volume:
+            self.motor_state = "Stopped"
+
+
+class WpiMicro4Simulator:
+    """Simulated Micro4 controller, speaking its serial protocol over a stream."""
+
+    def __init__(self, lines: int = 2, baudrate: int | None = 9600):
+        self.lines = [SimulatedLine() for _ in range(lines)]
+        self.selected_line = 1
+        # seconds to move one byte over the link, None doesn't pace the link
+        self.byte_time = 10 / baudrate if baudrate else None
+        # number of replies to come that lose their last byte on the wire
+        self.corrupt_replies = 0
+        self._clients: set[asyncio.StreamWriter] = set()
+
+    def _now(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    @property
+    def line(self) -> SimulatedLine:
+        return self.lines[self.selected_line - 1]
+
+    def handle(self, message: str) -> str:
+        """Return the reply to one ``\\r`` stripped command or query."""
+        now = self._now()
+        for line in self.lines:
+            line.advance(now)
+        line = self.line
+        if message.startswith("?"):
+            reply = self._query(message[1:], line)
+            return ERROR_REPLY if reply is None else f"{message}>{reply}"
+        reply = self._command(message, line)
+        if reply is None:
+            return ERROR_REPLY
+        return f"{message}{reply}"
+
+    def _query(self, letter: str, line: SimulatedLine) -> str | None:
+        match letter:
+            case "V":
+                return f"Target Volume = {line.target_volume:.1f}nL \n\rOK\n\r"
+            case "R":
+                return f"Rate = {line.rate:.1f} \n\rOK\n\r"
+            case "C":
+                return f"Volume Counter = {line.counter:.1f}nL \n\rOK\n\r"
+            case "D":
+                return f"Direction: {line.direction}\n\r>OK\n\r"
+            case "G":
+                return f"Motor State: {line.motor_state}\n\r>OK\n\r"
+            case "U":
+                return f"Rate Units: {line.rate_units}\n\r>OK\n\r"
+            case "M":
+                return f"Mode: {line.mode}\n\r>OK\n\r"
+            case "B":
+                return f"{line.drive}\n\r>OK\n\r"
+            case "E":
+                return f"{line.counter_mode}\n\r>OK\n\r"
+            case "S":
+                name, volume, unit, length = SYRINGE_TYPES[line.syringe]
+                return f"{name}, {volume:.1f}{unit}, {length:.1f}\n\r>OK\n\r"
+            case _:
+                return None
+
+    def _command(self, message: str, line: SimulatedLine) -> str | None:
+        letter, argument = message[:1], message[1:]
+        try:
+            match letter:
+                case "L" if 1 <= int(argument) <= len(self.lines):
+                    self.selected_line = int(argument)
+                case "V":
+                    line.target_volume = float(argument)
+                    return f">Target Volume = {line.target_volume:.1f}nL \n\rOK\n\r"
+                case "R":
+                    line.rate = float(argument)
+                    return f">Rate = {line.rate:.1f} \n\rOK\n\r"
+                case "T" if argument in SYRINGE_TYPES:
+                    line.syringe = argument
+                case "G" if not argument:
+                    line.motor_state = "Running"
+                case "H" | "Z" if not argument:  # Z kills the motor
+                    line.motor_state = "Stopped"
+                case "U" if not argument:
+                    line.motor_state = "Paused"
+                case "I" if not argument:
+                    line.direction = "Infuse"
+                case "W" if not argument:
+                    line.direction = "Withdraw"
+                case "S" if not argument:
+                    line.rate_units = "nL/Sec"
+                case "M" if not argument:
+                    line.rate_units = "nL/Min"
+                case "N" if not argument:
+                    line.mode = "Non-Grouped"
+                case "P" if not argument:
+                    line.mode = "Grouped"
+                case "D" if not argument:
+                    line.mode = "Disabled"
+                case "B" if argument in ("T", "S"):
+                    line.drive = {"T": "Max Load Drive", "S": "Smooth Drive"}[argument]
+                case "E" if argument in ("N", "I"):
+                    line.counter_mode = {
+                        "N": "Delivered Volume",
+                        "I": "Remaining Volume",
+                    }[argument]
+                case _:
+                    return None
+        except ValueError:
+            return None
+        return "\n\r>OK\n\r"
+
+    async def serve(
+        self,
+        reader: asyncio.StreamReader,
+        write: Callable[[bytes], object],
+    ) -> None:
+        """Answer the ``\\r`` terminated messages read until the stream is closed.
+
+        Messages are handled in the order they arrive and each reply is written
+        once the message and the reply have been paced over the link.
+        """
+        link_free = self._now()  # time the device is done with the last reply
+        while True:
+            try:
+                data = await reader.readuntil(b"\r")
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+            message = data[:-1].decode(errors="replace")
+            reply = self.handle(message).encode()
+            if self.corrupt_replies:
+                self.corrupt_replies -= 1
+                reply = reply[:-1]
+            if self.byte_time is not None:
+                # the message can't be read before it's on the wire, and the
+                # reply goes out behind any reply still being transmitted
+                done = max(link_free, self._now() + len(data) * self.byte_time)
+                link_free = done + len(reply) * self.byte_time
+                await asyncio.sleep(link_free - self._now())
+            write(reply)
+
+    async def start_tcp(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.Server:
+        """Serve on TCP, connect with ``socket://host:port`` of the returned server."""
+
+        async def handle_client(
+            reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+        ):
+            self._clients.add(writer)
+            try:
+                await self.serve(reader, writer.write)
+            finally:
+                self._clients.discard(writer)
+                writer.close()
+
+        return await asyncio.start_server(handle_client, host, port)
+
+    def drop_clients(self) -> None:
+        """Close the TCP connections of the clients, as if the USB adapter reset."""
+        for writer in self._clients:
+            writer.close()
+
+    async def start_pty(self) -> tuple[str, asyncio.Task[None]]:
+        """Serve on a new pty, returns the path to connect to and the serving task."""
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        os.set_blocking(master, False)
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+
+        def read_master():
+            try:
+                reader.feed_data(os.read(master, 4096))
+            except BlockingIOError:
+                pass
+
+        async def serve():
+            loop.add_reader(master, read_master)
+            try:
+                await self.serve(reader, lambda data: os.write(master, data))
+            finally:
+                loop.remove_reader(master)
+                os.close(master)
+                os.close(slave)
+
+        return os.ttyname(slave), asyncio.create_task(serve())
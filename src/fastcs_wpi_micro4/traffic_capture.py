@@ -0,0 +1,157 @@
+"""Capture of the serial traffic to a log file, and replay of a captured session.
+
+A capture is an append-only text file with one line per write to or read from the
+device, e.g. ``12.345678	>	L1\\r?C\\r``: the monotonic time, the direction (``>``
+written, ``<`` a reply, ``!`` input drained while resynchronising) and the bytes,
+escaped so every record stays on one line.
+
+``WpiMicro4TrafficReplay`` stands in for the device and answers each message with
+the reply captured for the same message on the same line, after the captured
+delay, so a session from the field can be run again through ``USBConnection``, the
+IO classes and the poll scheduler.
+"""
+
+import asyncio
+import codecs
+import time
+from collections import deque
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastcs_wpi_micro4.protocol import ERROR_REPLY
+
+WRITTEN = ">"
+RECEIVED = "<"
+DRAINED = "!"
+
+
+class TrafficCapture:
+    """Appends every write and read of a stream to a capture file."""
+
+    def __init__(self, path: str | Path):
+        self._file = open(path, "a", buffering=1, encoding="ascii")
+
+    def record(self, direction: str, data: str | bytes) -> None:
+        if isinstance(data, bytes):
+            data = data.decode("utf-8", errors="replace")
+        escaped = data.encode("unicode_escape").decode("ascii")
+        self._file.write(f"{time.monotonic():.6f}\t{direction}\t{escaped}\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _line_of(line: int | None, message: str) -> int | None:
+    # a line switch answers the same whichever line was selected before
+    return None if message.startswith("L") else line
+
+
+@dataclass(slots=True)
+class CapturedExchange:
+    line: int | None  # selected when the message was sent, None if unknown
+    message: str
+    reply: str
+    delay: float  # from the message, or the previous reply, to the reply
+
+
+def read_capture(path: str | Path) -> Iterator[tuple[float, str, str]]:
+    with open(path, encoding="ascii") as f:
+        for record in f:
+            timestamp, direction, escaped = record.rstrip("\n").split("\t", 2)
+            yield float(timestamp), direction, codecs.decode(escaped, "unicode_escape")
+
+
+def pair_exchanges(
+    records: Iterator[tuple[float, str, str]],
+) -> list[CapturedExchange]:
+    """Pair every captured reply with the message it answers.
+
+    Replies answer the written messages in order, input drained by a resync ends
+    the exchange so its unanswered messages are dropped.
+    """
+    exchanges: list[CapturedExchange] = []
+    pending: deque[tuple[float, str]] = deque()
+    line = None
+    previous = 0.0
+    for timestamp, direction, data in records:
+        if direction == WRITTEN:
+            for message in data.split("\r")[:-1]:
+                pending.append((timestamp, message + "\r"))
+        elif direction == DRAINED:
+            pending.clear()
+            line = None
+        elif pending:
+            sent, message = pending.popleft()
+            delay = timestamp - max(sent, previous)
+            exchanges.append(
+                CapturedExchange(_line_of(line, message), message, data, delay)
+            )
+            previous = timestamp
+            if message.startswith("L") and data.endswith("OK\n\r"):
+                line = int(message[1:-1])
+    return exchanges
+
+
+class WpiMicro4TrafficReplay:
+    """Stands in for the device, answering from a captured session.
+
+    Each message is answered with the next reply captured for it on the selected
+    line, once that runs out with the last one, after the captured delay divided by
+    ``speed``. Messages never captured get the error reply.
+    """
+
+    def __init__(self, exchanges: list[CapturedExchange], speed: float = 1.0):
+        self.speed = speed
+        self.line: int | None = None
+        self._replies: dict[tuple[int | None, str], deque[CapturedExchange]] = {}
+        self._last: dict[tuple[int | None, str], CapturedExchange] = {}
+        for exchange in exchanges:
+            key = (exchange.line, exchange.message)
+            self._replies.setdefault(key, deque()).append(exchange)
+
+    @classmethod
+    def from_capture(cls, path: str | Path, speed: float = 1.0):
+        return cls(pair_exchanges(read_capture(path)), speed)
+
+    def handle(self, message: str) -> tuple[str, float]:
+        """Return the reply to ``message`` and the delay to send it after."""
+        key = (_line_of(self.line, message), message)
+        replies = self._replies.get(key)
+        if replies:
+            exchange = self._last[key] = replies.popleft()
+        elif key in self._last:
+            exchange = self._last[key]
+        else:
+            return ERROR_REPLY, 0.0
+        if message.startswith("L") and exchange.reply.endswith("OK\n\r"):
+            self.line = int(message[1:-1])
+        return exchange.reply, exchange.delay / self.speed
+
+    async def serve(
+        self,
+        reader: asyncio.StreamReader,
+        write: Callable[[bytes], None],
+    ) -> None:
+        """Answer the ``\\r`` terminated messages read until the stream is closed."""
+        while True:
+            try:
+                data = await reader.readuntil(b"\r")
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+            reply, delay = self.handle(data.decode(errors="replace"))
+            await asyncio.sleep(delay)
+            write(reply.encode())
+
+    async def start_tcp(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.Server:
+        """Serve on TCP, connect with ``socket://host:port`` of the returned server."""
+
+        async def handle_client(
+            reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+        ):
+            try:
+                await self.serve(reader, writer.write)
+            finally:
+                writer.close()
+
+        return await asyncio.start_server(handle_client, host, port)
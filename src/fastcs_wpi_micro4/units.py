@@ -0,0 +1,86 @@
+"""Companions of the volumes and rates of the lines, normalised to nL and nL/s.
+
+The Micro4 replies with a volume in nL or uL, given in the reply, and with a rate
+in the rate units set on its line, nL/Sec or nL/Min, which the ``?R`` reply doesn't
+carry. Both are cached here: the unit of each volume as its reply is parsed by its
+IO, and the rate units of each line as they are read, by the initial sweep or the
+readback of a units write, so they only change once such a write has succeeded.
+Every reading is converted with the cached units, without a query of its own.
+"""
+
+from collections.abc import Awaitable, Callable
+
+from fastcs.attributes import AttrR
+from fastcs.datatypes import Float
+
+# to nL
+VOLUME_SCALES = {"nL": 1.0, "uL": 1e3}
+# to nL/s
+RATE_SCALES = {"nL/Sec": 1.0, "nL/Min": 1 / 60}
+
+
+class UnitCache:
+    def __init__(self):
+        # unit of the last reply of each volume, nL until one gives another
+        self._volume_units: dict[AttrR, str] = {}  # pyright: ignore[reportMissingTypeArgument]
+        # rate units of each line, None until read
+        self._rate_scales: dict[int, float | None] = {}
+
+    def record_volume_unit(self, attr: AttrR, unit: str | None) -> None:  # pyright: ignore[reportMissingTypeArgument, reportUnknownParameterType]
+        if unit is not None:
+            self._volume_units[attr] = unit  # pyright: ignore[reportUnknownMemberType]
+
+    def volume_nl(self, attr: AttrR, value: float) -> float:  # pyright: ignore[reportMissingTypeArgument, reportUnknownParameterType]
+        return value * VOLUME_SCALES[self._volume_units.get(attr, "nL")]  # pyright: ignore[reportUnknownMemberType]
+
+    def rate_nl_s(self, line: int, value: float) -> float | None:
+        scale = self._rate_scales.get(line)
+        return None if scale is None else value * scale
+
+    def add_volume(  # pyright: ignore[reportUnknownParameterType]
+        self,
+        attr: AttrR,  # pyright: ignore[reportMissingTypeArgument, reportUnknownParameterType]
+        on_reading: Callable[[Callable[[float], Awaitable[None]]], None] | None = None,
+    ) -> AttrR:  # pyright: ignore[reportMissingTypeArgument]
+        """Companion of the volume ``attr``, in nL.
+
+        It follows the updates of ``attr``, or the readings ``on_reading`` registers
+        it for, e.g. every raw reading of a polled volume with a deadband.
+        """
+        companion = AttrR(Float(units="nL", prec=2))
+
+        async def on_update(value: float):
+            await companion.update(self.volume_nl(attr, value))  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+
+        if on_reading is not None:
+            on_reading(on_update)
+        else:
+            # also the readings that repeat, for the companion's own always callbacks
+            attr.add_on_update_callback(on_update, always=True)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        return companion
+
+    def add_rate(  # pyright: ignore[reportUnknownParameterType]
+        self,
+        line: int,
+        rate: AttrR,  # pyright: ignore[reportMissingTypeArgument, reportUnknownParameterType]
+        rate_units: AttrR,  # pyright: ignore[reportMissingTypeArgument, reportUnknownParameterType]
+    ) -> AttrR:  # pyright: ignore[reportMissingTypeArgument]
+        """Companion of the rate of ``line``, in nL/s."""
+        companion = AttrR(Float(units="nL/s", prec=4))
+        self._rate_scales[line] = None
+
+        async def publish():
+            value = self.rate_nl_s(line, rate.get())  # pyright: ignore[reportUnknownArgumentType]
+            if value is not None:
+                await companion.update(value)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+
+        async def on_rate(value: float):
+            await publish()
+
+        async def on_rate_units(units: str):
+            self._rate_scales[line] = RATE_SCALES.get(units)
+            await publish()
+
+        rate.add_on_update_callback(on_rate)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        rate_units.add_on_update_callback(on_rate_units)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        return companion
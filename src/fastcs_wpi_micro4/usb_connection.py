@@ -1,9 +1,18 @@
 import asyncio
+import heapq
+import itertools
+import time
+from collections.abc import Iterable
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
 
 import serial_asyncio
 from fastcs.tracer import Tracer
 
+from fastcs_wpi_micro4.link_statistics import LinkStatistics
+from fastcs_wpi_micro4.protocol import ERROR_REPLY
+from fastcs_wpi_micro4.traffic_capture import DRAINED, RECEIVED, WRITTEN, TrafficCapture
+
 
 class DisconnectedError(Exception):
     """Raised if the ip connection is disconnected."""
@@ -11,10 +20,161 @@ class DisconnectedError(Exception):
     pass
 
 
+class ResponseError(Exception):
+    """Raised if an exchange failed, the stream is resynchronised before raising."""
+
+    pass
+
+
+class ResponseTimeoutError(ResponseError):
+    """Raised if a reply isn't complete by its deadline."""
+
+    pass
+
+
+class ErrorReplyError(ResponseError):
+    """Raised if the device rejects a message as an error or unknown command."""
+
+    pass
+
+
+class MisalignedResponseError(ResponseError, ValueError):
+    """Raised if a reply doesn't belong to the query it's paired with."""
+
+    pass
+
+
+class PollDroppedError(Exception):
+    """Raised if a periodic read is dropped because the link is backed up."""
+
+    pass
+
+
+class TimedReply(str):
+    """A reply, with the loop time the device is estimated to have read its value at.
+
+    That is the midpoint between the query reaching the device, once its bytes were
+    written and the previous reply was out, and the reply arriving, so it excludes
+    the wait for the link and the parsing of the reply.
+    """
+
+    midpoint: float
+
+
+def match_responses(messages: list[str], responses: list[str]) -> list[str]:
+    """Pair pipelined replies with the queries that were sent.
+
+    The serial link is FIFO so replies arrive in query order. Any reply that starts
+    with an echoed query (e.g. ``?C>Volume Counter = ...``) is checked against the
+    query it is paired with, so a reply can never be attributed to the wrong PV.
+    """
+    if len(messages) != len(responses):
+        raise MisalignedResponseError(
+            f"Got {len(responses)} responses for {len(messages)} queries"
+        )
+    for message, response in zip(messages, responses, strict=True):
+        echo = message.strip()
+        reply = response.lstrip()
+        if reply.startswith("?") and not reply.startswith(echo):
+            raise MisalignedResponseError(
+                f"Response {response!r} doesn't echo {echo!r}"
+            )
+    return responses
+
+
+def plan_line_queries(
+    selected_line: int | None, queries: list[tuple[int | None, str]]
+) -> tuple[list[str], list[int | None], int | None]:
+    """Order line-addressed queries to need as few ``L`` switches as possible.
+
+    Returns the messages to write, the index into ``queries`` of each message (None
+    for an inserted line switch) and the line selected once they have been sent.
+
+    >>> plan_line_queries(2, [(1, "?C\\r"), (2, "?C\\r"), (1, "?G\\r")])[0]
+    ['?C\\r', 'L1\\r', '?C\\r', '?G\\r']
+    """
+    groups: dict[int | None, list[int]] = {}
+    for index, (line, _) in enumerate(queries):
+        groups.setdefault(line, []).append(index)
+
+    messages: list[str] = []
+    indices: list[int | None] = []
+    # stable sort keeps the other lines in the order they were first asked for
+    for line in sorted(groups, key=lambda line: line not in (None, selected_line)):
+        if line is not None and line != selected_line:
+            messages.append(f"L{line}\r")
+            indices.append(None)
+            selected_line = line
+        for index in groups[line]:
+            messages.append(queries[index][1])
+            indices.append(index)
+    return messages, indices, selected_line
+
+
+# deadline of each reply, counted from the previous one, a reply takes ~40 ms at 9600
+QUERY_TIMEOUT = 0.5
+# the input is drained until it has been quiet this long, at most RESYNC_TIMEOUT
+RESYNC_QUIET = 0.05
+RESYNC_TIMEOUT = 1.0
+# exchanges timing out in a row taken as a lost link, e.g. a controller switched off
+# behind a USB adapter that is still there
+LINK_LOST_TIMEOUTS = 3
+# line of the reply to an unknown or malformed message
+ERROR_REPLY_LINE = ERROR_REPLY.encode()
+
+# lock priorities, lower goes first
+PRIORITY_URGENT = 0
+PRIORITY_NORMAL = 1
+
+# stop, pause and kill, a transaction sending any of them jumps the queued polls
+URGENT_COMMANDS = frozenset({"H", "U", "Z"})
+
+# transactions queued for the link beyond which new periodic reads are dropped
+MAX_PENDING = 8
+
+
+class PriorityLock:
+    """Lock handed to its waiters lowest priority first, FIFO within a priority.
+
+    A transaction that holds the link isn't interrupted, an urgent waiter goes next.
+    """
+
+    def __init__(self):
+        self._locked = False
+        self._waiters: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._order = itertools.count()
+
+    def locked(self) -> bool:
+        return self._locked
+
+    async def acquire(self, priority: int = PRIORITY_NORMAL) -> None:
+        if not self._locked:
+            self._locked = True
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # the lock may have been handed over just before the cancellation
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)  # hand over without unlocking
+                return
+        self._locked = False
+
+
 @dataclass
 class USBConnectionSettings:
     port: str = "/dev/ttyUSB0"
     baudrate: int = 9600
+    capture_path: str | None = None  # file to append the serial traffic to
 
 
 @dataclass
@@ -23,9 +183,10 @@ class StreamConnection:
 
     reader: asyncio.StreamReader
     writer: asyncio.StreamWriter
+    capture: TrafficCapture | None = None
 
     def __post_init__(self):
-        self._lock = asyncio.Lock()
+        self._lock = PriorityLock()
 
     async def __aenter__(self):
         await self._lock.acquire()
@@ -34,15 +195,65 @@ class StreamConnection:
     async def __aexit__(self, exc_type, exc_val, exc_tb):  # type: ignore
         self._lock.release()
 
+    @asynccontextmanager
+    async def prioritised(self, priority: int):
+        """Hold the stream like ``async with``, ahead of lower priority waiters."""
+        await self._lock.acquire(priority)
+        try:
+            yield self
+        finally:
+            self._lock.release()
+
     async def send_message(self, message: str) -> None:
+        if self.capture is not None:
+            self.capture.record(WRITTEN, message)
         self.writer.write(message.encode("utf-8"))
         await self.writer.drain()
 
-    async def receive_response(self) -> str:
-        data = await self.reader.readuntil(b"OK\n\r")
+    async def receive_response(self, timeout: float = QUERY_TIMEOUT) -> str:
+        """Read one reply, up to its ``OK``, within ``timeout`` seconds."""
+        data = b""
+        try:
+            async with asyncio.timeout(timeout):
+                while not data.endswith(b"OK\n\r"):
+                    line = await self.reader.readuntil(b"\n\r")
+                    data += line
+                    if line.lstrip(b">") == ERROR_REPLY_LINE:
+                        raise ErrorReplyError(f"Error reply {data!r}")
+        except TimeoutError as e:
+            raise ResponseTimeoutError(
+                f"No complete reply within {timeout} s, got {data!r}"
+            ) from e
+        finally:
+            if self.capture is not None and data:
+                self.capture.record(RECEIVED, data)
         return data.decode("utf-8")
 
+    async def resync(self) -> bytes:
+        """Drain the input until the device has gone quiet, returns what was dropped.
+
+        Replies still on their way from a failed exchange are dropped with it, so the
+        next exchange starts at the start of its first reply.
+        """
+        drained = b""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + RESYNC_TIMEOUT
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                async with asyncio.timeout(min(RESYNC_QUIET, remaining)):
+                    data = await self.reader.read(4096)
+            except TimeoutError:
+                break
+            if not data:
+                break
+            drained += data
+        if self.capture is not None:
+            self.capture.record(DRAINED, drained)
+        return drained
+
     async def close(self):
+        if self.capture is not None:
+            self.capture.close()
         self.writer.close()
         await self.writer.wait_closed()
 
@@ -53,6 +264,19 @@ class USBConnection(Tracer):
     def __init__(self):
         super().__init__()
         self.__connection = None
+        # pump line the device has selected, None until a transaction selects one
+        self._selected_line: int | None = None
+        # set once the serial link has failed, until the next connect()
+        self.link_lost = asyncio.Event()
+        self.statistics = LinkStatistics()
+        # exchanges that have timed out since the last one answered
+        self._timeouts_in_a_row = 0
+        # pump lines that answered the last probe_lines(), None until probed
+        self.fitted_lines: tuple[int, ...] | None = None
+        # replies of the periodic reads waiting for the link, by their queries
+        self._waiting_polls: dict[
+            tuple[tuple[int | None, str], ...], asyncio.Future[list[str]]
+        ] = {}
 
     @property
     def _connection(self) -> StreamConnection:
@@ -63,27 +287,230 @@ class USBConnection(Tracer):
 
         return self.__connection
 
+    @property
+    def connected(self) -> bool:
+        return self.__connection is not None
+
+    @property
+    def selected_line(self) -> int | None:
+        return self._selected_line
+
     async def connect(self, settings: USBConnectionSettings):
+        if self.__connection is not None:
+            await self._drop_link(self.__connection)
         reader, writer = await serial_asyncio.open_serial_connection(  # type: ignore
             url=settings.port, baudrate=settings.baudrate
         )
-        self.__connection = StreamConnection(reader, writer)  # type: ignore
+        capture = (
+            TrafficCapture(settings.capture_path) if settings.capture_path else None
+        )
+        self.__connection = StreamConnection(reader, writer, capture)  # pyright: ignore[reportUnknownArgumentType]
+        self._selected_line = None
+        self._timeouts_in_a_row = 0
+        self.link_lost.clear()
 
     async def send_command(self, message: str) -> None:
-        async with self._connection as connection:
-            await connection.send_message(message)
+        """Send a command, reading its reply so the next exchange stays aligned."""
+        await self.send_line_queries([(None, message)])
 
-    async def send_query(self, message: str) -> str:
-        async with self._connection as connection:
-            await connection.send_message(message)
-            response = await connection.receive_response()
-            self.log_event(  # type: ignore
-                "Received query response",
-                query=message.strip(),
-                response=response.strip(),
+    async def send_query(
+        self, message: str, line: int | None = None, periodic: bool = False
+    ) -> str:
+        """Send a query, selecting ``line`` first in the same transaction."""
+        (response,) = await self.send_line_queries([(line, message)], periodic)
+        return response
+
+    async def send_line_queries(
+        self, queries: list[tuple[int | None, str]], periodic: bool = False
+    ) -> list[str]:
+        """Send queries addressed to pump lines as one atomic transaction.
+
+        The link is held across the line selections and the queries, so no other
+        coroutine can switch lines in between and every reply belongs to the line it
+        was sent for. Queries are grouped per line, starting with the line that is
+        already selected, so each line is switched to at most once. Queries for line
+        ``None`` don't care which line is selected. Replies are returned in the
+        order of ``queries``.
+
+        Transactions sending any of the ``URGENT_COMMANDS`` take the link ahead of
+        every queued transaction.
+
+        ``periodic`` reads don't pile up behind a slow link: one sending the same
+        queries as a periodic read still waiting for the link gets the replies of
+        that one, and one finding ``MAX_PENDING`` transactions queued raises
+        ``PollDroppedError``. Writes and their read-backs are never dropped.
+        """
+        if not periodic:
+            return await self._send_line_queries(queries)
+
+        key = tuple(queries)
+        waiting = self._waiting_polls.get(key)
+        if waiting is not None:
+            self.statistics.coalesced_polls += 1
+            return await asyncio.shield(waiting)
+        if self.statistics.pending >= MAX_PENDING:
+            self.statistics.dropped_polls += 1
+            raise PollDroppedError(
+                f"{self.statistics.pending} transactions queued for the link"
             )
+
+        waiting = asyncio.get_running_loop().create_future()
+        self._waiting_polls[key] = waiting
+        try:
+            responses = await self._send_line_queries(queries, key)
+        except asyncio.CancelledError:
+            waiting.cancel()
+            raise
+        except Exception as e:
+            waiting.set_exception(e)
+            waiting.exception()  # retrieved, whether or not another read shared it
+            raise
+        finally:
+            if self._waiting_polls.get(key) is waiting:
+                del self._waiting_polls[key]
+        waiting.set_result(responses)
+        return responses
+
+    async def _send_line_queries(
+        self,
+        queries: list[tuple[int | None, str]],
+        poll_key: tuple[tuple[int | None, str], ...] | None = None,
+    ) -> list[str]:
+        urgent = any(message.strip() in URGENT_COMMANDS for _, message in queries)
+        priority = PRIORITY_URGENT if urgent else PRIORITY_NORMAL
+        async with self._transaction(priority) as connection:
+            if poll_key is not None:
+                # reads from here on are newer than the replies of this one
+                self._waiting_polls.pop(poll_key, None)
+            messages, indices, selected_line = plan_line_queries(
+                self._selected_line, queries
+            )
+            # the selected line is unknown until the transaction has gone through
+            self._selected_line = None
+            responses = await self._exchange(connection, messages)
+            self._selected_line = selected_line
+
+        ordered = [""] * len(queries)
+        for index, response in zip(indices, responses, strict=True):
+            if index is not None:
+                ordered[index] = response
+        self.log_event(  # type: ignore
+            "Received query responses",
+            queries=[message.strip() for message in messages],
+            responses=[response.strip() for response in responses],
+        )
+        return ordered
+
+    async def select_line(self, line: int) -> str:
+        """Select the pump line that commands without a line go to."""
+        async with self._transaction() as connection:
+            self._selected_line = None
+            (response,) = await self._exchange(connection, [f"L{line}\r"])
+            self._selected_line = line
             return response
 
+    async def probe_lines(self, lines: Iterable[int]) -> tuple[int, ...]:
+        """Find which of ``lines`` are fitted, the device rejects a switch to others."""
+        fitted: list[int] = []
+        for line in lines:
+            try:
+                await self.select_line(line)
+            except ErrorReplyError:
+                continue
+            fitted.append(line)
+        self.fitted_lines = tuple(fitted)
+        return self.fitted_lines
+
+    @asynccontextmanager
+    async def _transaction(self, priority: int = PRIORITY_NORMAL):
+        """Hold the link for one transaction, counting the wait for it."""
+        statistics = self.statistics
+        statistics.pending += 1
+        statistics.pending_max = max(statistics.pending_max, statistics.pending)
+        try:
+            start = time.perf_counter()
+            async with self._connection.prioritised(priority) as connection:
+                statistics.record_lock_wait(time.perf_counter() - start)
+                yield connection
+        finally:
+            statistics.pending -= 1
+
+    async def _exchange(
+        self, connection: StreamConnection, messages: list[str]
+    ) -> list[str]:
+        """Write the messages and read their replies, resynchronising on failure.
+
+        A failure of the serial link itself, e.g. the USB adapter resetting, or
+        ``LINK_LOST_TIMEOUTS`` exchanges timing out in a row, drops the stream and
+        raises ``DisconnectedError`` until the next ``connect()``.
+        """
+        if connection is not self.__connection:
+            raise DisconnectedError("Link was lost while waiting for it")
+        statistics = self.statistics
+        try:
+            data = "".join(messages)
+            await connection.send_message(data)
+            statistics.bytes_sent += len(data)
+            loop = asyncio.get_running_loop()
+            written = loop.time()
+            try:
+                responses: list[str] = []
+                previous = time.perf_counter()
+                for message in messages:
+                    response = TimedReply(await connection.receive_response())
+                    now = time.perf_counter()
+                    statistics.record_reply(message, now - previous, len(response))
+                    previous = now
+                    arrived = loop.time()
+                    response.midpoint = (written + arrived) / 2
+                    # the device answers the pipelined queries one after the other
+                    written = arrived
+                    responses.append(response)
+                self._timeouts_in_a_row = 0
+                return match_responses(messages, responses)
+            except ResponseError as e:
+                if isinstance(e, ResponseTimeoutError):
+                    statistics.timeouts += 1
+                    self._timeouts_in_a_row += 1
+                    if self._timeouts_in_a_row >= LINK_LOST_TIMEOUTS:
+                        await self._lose_link(connection, e)
+                        raise DisconnectedError(
+                            f"No reply to {self._timeouts_in_a_row} exchanges in a row"
+                        ) from e
+                elif isinstance(e, ErrorReplyError):
+                    statistics.error_replies += 1
+                else:
+                    statistics.misaligned += 1
+                start = loop.time()
+                drained = await connection.resync()
+                statistics.bytes_received += len(drained)
+                self.log_event(  # type: ignore
+                    "Resynchronised after a failed exchange",
+                    error=str(e),
+                    drained=drained,
+                    resync_s=loop.time() - start,
+                )
+                raise
+        except (OSError, EOFError) as e:
+            await self._lose_link(connection, e)
+            raise DisconnectedError(f"Serial link lost: {e}") from e
+
+    async def _lose_link(self, connection: StreamConnection, error: Exception):
+        self.log_event("Serial link lost", error=str(error))  # pyright: ignore[reportUnknownMemberType]
+        self.statistics.link_losses += 1
+        await self._drop_link(connection)
+        self.link_lost.set()
+
+    async def _drop_link(self, connection: StreamConnection) -> None:
+        if connection is self.__connection:
+            self.__connection = None
+            self._selected_line = None
+        try:
+            async with asyncio.timeout(RESYNC_TIMEOUT):
+                await connection.close()
+        except Exception:
+            pass  # the link is gone already
+
     async def close(self):
         async with self._connection as connection:
             await connection.close()
@@ -1,11 +1,36 @@
-from fastcs.attributes import AttrR, AttrRW
+import asyncio
+import os
+import time
+from collections.abc import Mapping, Sequence
+from functools import partial
+from typing import Any
+
+from fastcs.attributes import AttrR, AttrRW, AttrW
 from fastcs.controllers import Controller
-from fastcs.datatypes import Float, Int, String
+from fastcs.datatypes import Bool, Int, String
+from fastcs.logging import logger
+from fastcs.methods import Scan, scan  # pyright: ignore[reportUnknownVariableType]
 
-from fastcs_wpi_micro4.usb_connection import USBConnection, USBConnectionSettings
+from fastcs_wpi_micro4.command_table import LINE_ATTRIBUTES
+from fastcs_wpi_micro4.connection_supervisor import WpiMicro4ConnectionSupervisor
+from fastcs_wpi_micro4.deadband import Deadband
+from fastcs_wpi_micro4.line_history import HISTORY_PERIOD, LineHistory
+from fastcs_wpi_micro4.link_budget import LinkBudget
+from fastcs_wpi_micro4.poll_scheduler import POLL_TICK, WpiMicro4PollScheduler
+from fastcs_wpi_micro4.units import UnitCache
+from fastcs_wpi_micro4.usb_connection import (
+    DisconnectedError,
+    ResponseError,
+    USBConnection,
+    USBConnectionSettings,
+)
+from fastcs_wpi_micro4.volume_estimator import ESTIMATE_PERIOD, VolumeEstimator
 from fastcs_wpi_micro4.wpi_micro4_controller_command_setting import (
     WpiMicro4ControllerCommandSettingIO,
-    WpiMicro4ControllerCommandSettingIORef,
+)
+from fastcs_wpi_micro4.wpi_micro4_controller_emergency_stop import (
+    WpiMicro4ControllerEmergencyStopIO,
+    WpiMicro4ControllerEmergencyStopIORef,
 )
 from fastcs_wpi_micro4.wpi_micro4_controller_line_setting import (
     WpiMicro4ControllerLineSettingIO,
@@ -25,159 +50,276 @@ from fastcs_wpi_micro4.wpi_micro4_controller_type_setting import (
 )
 from fastcs_wpi_micro4.wpi_micro4_controller_value_setting import (
     WpiMicro4ControllerValueSettingIO,
-    WpiMicro4ControllerValueSettingIORef,
 )
+from fastcs_wpi_micro4.wpi_micro4_diagnostics_controller import (
+    WpiMicro4DiagnosticsController,
+)
+
+# lines of a Micro4 controller, the fitted ones are found when connecting
+MAX_LINES = 4
+
+
+def _process_age() -> float | None:
+    """Seconds since this process started, None where /proc isn't available."""
+    try:
+        with open("/proc/self/stat") as f:
+            # the start time is the 20th field after the parenthesised command name
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+    except (OSError, IndexError, ValueError):
+        return None
+    started = ticks / os.sysconf("SC_CLK_TCK")
+    return round(time.clock_gettime(time.CLOCK_BOOTTIME) - started, 2)
 
 
 class WpiMicro4Controller(Controller):
-    def __init__(self, settings: USBConnectionSettings):
+    def __init__(
+        self,
+        settings: USBConnectionSettings,
+        lines: Sequence[int] | None = None,
+        deadbands: Mapping[str, Deadband] | None = None,
+        estimate_period: float = ESTIMATE_PERIOD,
+    ):
         self._usb_settings = settings
+        # the attributes are built for these lines, None discovers them in initialise
+        self._lines = lines
+        # by attribute name, e.g. volume_couner_l1, or for every line volume_couner_l
+        self._deadbands = deadbands or {}
         self.connection = USBConnection()
+        # attributes read periodically, in one sweep per tick, within the link budget
+        self._link_budget = LinkBudget(settings.baudrate)
+        self._poll_scheduler = WpiMicro4PollScheduler(
+            self.connection, self._link_budget
+        )
+        self._sweep: asyncio.Task[None] | None = None  # of the poll in flight
 
-        super().__init__(  # type: ignore
-            ios=[
-                WpiMicro4ControllerValueSettingIO(self.connection),
-                WpiMicro4ControllerTypeSettingIO(self.connection),
-                WpiMicro4ControllerLineSettingIO(self.connection),
-                WpiMicro4ControllerQueryIO(self.connection),
-                WpiMicro4ControllerStateSettingIO(self.connection),
-                WpiMicro4ControllerCommandSettingIO(self.connection),
-            ]
+        # units of the volumes and rates, for their companions in nL and nL/s
+        self._units = UnitCache()
+
+        ios = [
+            WpiMicro4ControllerValueSettingIO(self.connection, self._units),
+            WpiMicro4ControllerTypeSettingIO(self.connection),
+            WpiMicro4ControllerLineSettingIO(self.connection),
+            WpiMicro4ControllerQueryIO(self.connection, self._units),
+            WpiMicro4ControllerStateSettingIO(self.connection, self._poll_scheduler),
+            WpiMicro4ControllerCommandSettingIO(self.connection),
+            WpiMicro4ControllerEmergencyStopIO(self.connection),
+        ]
+        super().__init__(ios=ios)  # pyright: ignore[reportUnknownMemberType]
+        self._ios = {io.ref_type: io for io in ios}  # pyright: ignore[reportUnknownMemberType]
+        # attributes whose value is read once, by the batched initial sweep
+        self._initial_read_attrs: list[AttrR] = []  # pyright: ignore[reportMissingTypeArgument]
+        # reconnects after the serial link is lost, and refreshes every attribute
+        self._supervisor = WpiMicro4ConnectionSupervisor(
+            self.connection, settings, self.refresh
         )
+        self.connection_status = self._supervisor.status
+        self.reconnect_count = self._supervisor.reconnect_count
+        self.downtime = self._supervisor.downtime
+        self.link_utilisation = self._link_budget.utilisation
+        self.diagnostics = WpiMicro4DiagnosticsController(self.connection.statistics)
+        # extrapolate the volume counters between their polls, without any queries
+        self._volume_estimators: list[VolumeEstimator] = []
+        # history and measured flow rate of each line, from the polled readings
+        self._line_histories: list[LineHistory] = []
+        self.estimate_volumes = Scan(self._estimate_volumes, estimate_period)
+
+        if lines is not None:
+            self.creat_setting_attributes(lines)
+
+    async def initialise(self):
+        if self._lines is None:
+            self._lines = await self.discover_lines()
+            self.creat_setting_attributes(self._lines)
 
-        self.creat_setting_attributes()
+    async def discover_lines(self) -> Sequence[int]:
+        every_line = range(1, MAX_LINES + 1)
+        try:
+            await self.connection.connect(self._usb_settings)
+            return await self.connection.probe_lines(every_line)
+        except (OSError, EOFError, DisconnectedError, ResponseError) as e:
+            # the lines that aren't fitted are skipped once the link is up
+            logger.warning("Line discovery failed", error=str(e))
+            return every_line
 
     async def connect(self):
-        await self.connection.connect(self._usb_settings)
-
-    def creat_setting_attributes(self):
-        float_atrr_names_commands = ["volume_l", "delivery_rate_l"]
-        float_commands = ["V", "R"]
-        float_queries = ["V", "R"]
-        float_expeted_prefixes = ["Target Volume = ", ">Rate = "]
-
-        string_atrr_base_names = [  # pv values are commands
-            "pump_direction_l",  # I/W
-            "rate_units_l",  # S/M
-            "mode_l",  # P/N/D
-            "motor_drive_l",  # BT/BS
-            "volume_counter_mode_l",  # EI/EN
-        ]
-        string_queries = ["D", "U", "M", "B", "E"]
-        string_expeted_prefixes = [
-            ">Direction: ",
-            ">Rate Units: ",
-            ">Mode: ",
-            ">",
-            ">",
-        ]
+        try:
+            if not self.connection.connected:
+                await self.connection.connect(self._usb_settings)
+                await self.connection.probe_lines(self._lines or ())
+            start = time.perf_counter()
+            await self.read_initial_values()
+        except (OSError, EOFError, DisconnectedError, ResponseError) as e:
+            # the IOC comes up without the device, the supervisor keeps trying
+            logger.error("Not connected", port=self._usb_settings.port, error=str(e))
+            if self.connection.connected:
+                await self.connection.close()
+        else:
+            logger.info(
+                "Initial values read in {sweep_s} s, {since_process_start_s} s after "
+                "the process started",
+                lines=self.connection.fitted_lines,
+                sweep_s=round(time.perf_counter() - start, 3),
+                since_process_start_s=_process_age(),
+            )
+        self._connected = True  # lets the FastCS scan tasks run
+        self._supervisor.start()
+
+    async def disconnect(self):
+        if self._sweep is not None:
+            self._sweep.cancel()
+            await asyncio.gather(self._sweep, return_exceptions=True)
+        await self._supervisor.stop()
+        if self.connection.connected:
+            await self.connection.close()
+
+    async def read_initial_values(self):
+        # the polled attributes are read in the same sweep, so every PV has a value
+        # once it is done, and are next due a poll period after it
+        await self.read_values(  # pyright: ignore[reportUnknownMemberType]
+            self._initial_read_attrs + self._poll_scheduler.attrs()  # pyright: ignore[reportUnknownMemberType]
+        )
+        self._poll_scheduler.mark_read(asyncio.get_running_loop().time())
 
-        atrr_names_queries_only = [
-            "volume_couner_l",
+    async def refresh(self):
+        # after a reconnect the lines fitted may have changed
+        await self.connection.probe_lines(self._lines or ())
+        await self.read_initial_values()
+
+    async def read_values(self, attrs: list[AttrR]):  # pyright: ignore[reportMissingTypeArgument, reportUnknownParameterType]
+        fitted = self.connection.fitted_lines
+        attrs = [  # pyright: ignore[reportUnknownVariableType]
+            attr
+            for attr in attrs  # pyright: ignore[reportUnknownVariableType]
+            if fitted is None or attr.io_ref.line_num in fitted  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
         ]
-        queries_only = ["C"]
-        queries_only_expected_prefixes = [">Volume Counter = "]
-
-        # pump number
-        attr_name = "pump_number"
-        pump_command = "L"
-        pump_atrr_instance = AttrRW(  # type: ignore
-            Int(),
-            io_ref=WpiMicro4ControllerLineSettingIORef(  # type: ignore
-                pump_command,
-            ),
-            initial_value=1,
+        # the reads of every line go out as one pipelined transaction
+        ios = [self._ios[type(attr.io_ref)] for attr in attrs]  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType, reportUnknownVariableType]
+        responses = await self.connection.send_line_queries(
+            [
+                (attr.io_ref.line_num, io.query_message(attr))  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType]
+                for io, attr in zip(ios, attrs, strict=True)  # pyright: ignore[reportUnknownArgumentType, reportUnknownVariableType]
+            ]
         )
-        setattr(
-            self,
-            attr_name,
-            pump_atrr_instance,
+        for io, attr, response in zip(ios, attrs, responses, strict=True):  # pyright: ignore[reportUnknownArgumentType, reportUnknownVariableType]
+            await io.set(response, attr)  # pyright: ignore[reportUnknownArgumentType, reportUnknownMemberType]
+
+    @scan(POLL_TICK)  # pyright: ignore[reportUntypedFunctionDecorator]
+    async def poll(self):
+        # the FastCS scans only pause for the root controller, so the polls of each
+        # pump wait here while its supervisor reconnects and refreshes the link
+        if not self._supervisor.connected:
+            return
+        # a sweep outlasting the tick is left to finish, rather than holding up
+        # the scans of the other pumps of a multi-pump IOC, which share the tick
+        if self._sweep is None or self._sweep.done():
+            self._sweep = asyncio.create_task(self.poll_once())
+
+    async def poll_once(self):
+        try:
+            await self._poll_scheduler.tick()
+        except Exception as e:
+            # a failing pump doesn't pause the scans, of its own or other pumps
+            logger.error("Poll failed", error=str(e))
+
+    async def _estimate_volumes(self):
+        now = asyncio.get_running_loop().time()
+        for estimator in self._volume_estimators:
+            await estimator.publish(now)
+
+    @scan(HISTORY_PERIOD)  # pyright: ignore[reportUntypedFunctionDecorator]
+    async def publish_histories(self):
+        now = asyncio.get_running_loop().time()
+        for history in self._line_histories:
+            await history.publish(now)
+
+    def creat_setting_attributes(self, lines: Sequence[int]):
+        # pump line last selected by a transaction, read only
+        self.pump_number = AttrR(  # pyright: ignore[reportUnknownMemberType]
+            Int(min=1, max=MAX_LINES),
+            io_ref=WpiMicro4ControllerLineSettingIORef(),  # pyright: ignore[reportCallIssue]
+            initial_value=1,
         )
 
-        for line in range(2):
-            for j in range(len(float_atrr_names_commands)):
-                base_name = float_atrr_names_commands[j]
-                attr_name = f"{base_name}{line + 1}"
-                setattr(
-                    self,
-                    attr_name,
-                    AttrRW(
-                        Float(prec=1),
-                        io_ref=WpiMicro4ControllerValueSettingIORef(  # type: ignore
-                            float_commands[j],
-                            float_queries[j],
-                            float_expeted_prefixes[j],
-                            line + 1,
-                            pump_atrr_instance,
-                        ),
-                    ),
-                )
-            for j in range(len(string_atrr_base_names)):
-                base_name = string_atrr_base_names[j]
-                attr_name = f"{base_name}{line + 1}"
-                setattr(
-                    self,
-                    attr_name,
-                    AttrRW(
-                        String(),
-                        io_ref=WpiMicro4ControllerCommandSettingIORef(  # type: ignore
-                            string_queries[j],
-                            string_expeted_prefixes[j],
-                            line + 1,
-                            pump_atrr_instance,
-                        ),
-                    ),
+        for line in lines:
+            for spec in LINE_ATTRIBUTES:
+                extra: dict[str, Any] = {}
+                if spec.io_ref is WpiMicro4ControllerTypeSettingIORef:  # pyright: ignore[reportUnknownMemberType]
+                    # the syringe type's reply also sets its volume and length
+                    extra = {
+                        "volume_att": AttrR(String()),
+                        "length_att": AttrR(String()),
+                    }
+                    setattr(self, f"syringe_volume_l{line}", extra["volume_att"])
+                    setattr(self, f"syringe_length_l{line}", extra["length_att"])
+                name = f"{spec.name}{line}"
+                deadband = self._deadbands.get(name, self._deadbands.get(spec.name))
+                if deadband is not None:
+                    extra["deadband"] = deadband
+                attr_class = AttrRW if spec.writable else AttrR
+                attr = attr_class(  # pyright: ignore[reportUnknownVariableType]
+                    spec.datatype,
+                    io_ref=spec.make_io_ref(line, **extra),  # pyright: ignore[reportCallIssue, reportUnknownMemberType]
                 )
-            for j in range(len(atrr_names_queries_only)):
-                base_name = atrr_names_queries_only[j]
-                attr_name = f"{base_name}{line + 1}"
-                setattr(
-                    self,
-                    attr_name,
-                    AttrR(
-                        Float(),
-                        io_ref=WpiMicro4ControllerQueryIORef(  # type: ignore
-                            queries_only[j],
-                            queries_only_expected_prefixes[j],
-                            line + 1,
-                            pump_atrr_instance,
-                        ),
-                    ),
+                setattr(self, name, attr)
+                if spec.poll is None:
+                    self._initial_read_attrs.append(attr)  # pyright: ignore[reportUnknownMemberType]
+                    continue
+                self._poll_scheduler.add(  # pyright: ignore[reportUnknownMemberType]
+                    attr,
+                    self._ios[type(attr.io_ref)],  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType]
+                    spec.poll.period,
+                    spec.poll.idle_period,
+                    spec.poll.priority,
                 )
-            # state
-            state_base_name = "pump_state_l"
-            state_query = "G"
-            state_query_prefix = ">Motor State: "  # G/H/U/*G/Z (kill)
-            attr_name = f"{state_base_name}{line + 1}"
-            setattr(
-                self,
-                attr_name,
-                AttrRW(
-                    String(),
-                    io_ref=WpiMicro4ControllerStateSettingIORef(  # type: ignore
-                        state_query, state_query_prefix, line + 1, pump_atrr_instance
-                    ),
-                ),
+                if spec.io_ref is WpiMicro4ControllerStateSettingIORef:  # pyright: ignore[reportUnknownMemberType]
+                    self._poll_scheduler.watch_motor_state(line, attr)  # pyright: ignore[reportUnknownMemberType]
+
+            # companions of the volumes and rate in nL and nL/s, whatever the units
+            counter = getattr(self, f"volume_couner_l{line}")
+            query_io = self._ios[WpiMicro4ControllerQueryIORef]  # pyright: ignore[reportUnknownMemberType]
+            # every raw reading of the counter, the deadband only holds back its PV
+            counter_nl = self._units.add_volume(  # pyright: ignore[reportUnknownMemberType, reportUnknownVariableType]
+                counter,
+                partial(query_io.add_reading_callback, counter),  # pyright: ignore[reportUnknownMemberType]
             )
+            target_nl = self._units.add_volume(getattr(self, f"volume_l{line}"))  # pyright: ignore[reportUnknownMemberType, reportUnknownVariableType]
+            rate_nl_s = self._units.add_rate(  # pyright: ignore[reportUnknownMemberType, reportUnknownVariableType]
+                line,
+                getattr(self, f"delivery_rate_l{line}"),
+                getattr(self, f"rate_units_l{line}"),
+            )
+            setattr(self, f"volume_couner_nl_l{line}", counter_nl)
+            setattr(self, f"volume_nl_l{line}", target_nl)
+            setattr(self, f"delivery_rate_nl_s_l{line}", rate_nl_s)
 
-            # type
-            att_volume = AttrR(String())
-            base_name = "syringe_volume_l"
-            attr_name = f"{base_name}{line + 1}"
-            setattr(self, attr_name, att_volume)
-            att_length = AttrR(String())
-            base_name = "syringe_length_l"
-            attr_name = f"{base_name}{line + 1}"
-            setattr(self, attr_name, att_length)
-            base_name = "type_l"
-            attr_name = f"{base_name}{line + 1}"
-            setattr(
-                self,
-                attr_name,
-                AttrRW(
-                    String(),
-                    io_ref=WpiMicro4ControllerTypeSettingIORef(  # type: ignore
-                        ">", line + 1, att_volume, att_length, pump_atrr_instance
-                    ),
-                ),
+            read_time = partial(query_io.read_time, counter)  # pyright: ignore[reportUnknownMemberType]
+            estimator = VolumeEstimator(
+                counter_nl,
+                target_nl,
+                rate_nl_s,
+                getattr(self, f"volume_counter_mode_l{line}"),
+                getattr(self, f"pump_state_l{line}"),
+                read_time=read_time,
             )
+            setattr(self, f"volume_estimate_l{line}", estimator.estimate)
+            setattr(self, f"volume_estimate_error_l{line}", estimator.error)
+            self._volume_estimators.append(estimator)
+
+            history = LineHistory(
+                counter_nl,
+                getattr(self, f"pump_state_l{line}"),
+                read_time=read_time,
+            )
+            setattr(self, f"measured_rate_l{line}", history.rate)
+            setattr(self, f"history_time_l{line}", history.times)
+            setattr(self, f"history_volume_l{line}", history.volumes)
+            setattr(self, f"history_state_l{line}", history.states)
+            self._line_histories.append(history)
+
+        # kills every line, ahead of any queued polls
+        self.emergency_stop = AttrW(  # pyright: ignore[reportUnknownMemberType]
+            Bool(),
+            io_ref=WpiMicro4ControllerEmergencyStopIORef(  # pyright: ignore[reportCallIssue]
+                tuple(lines)
+            ),
+        )
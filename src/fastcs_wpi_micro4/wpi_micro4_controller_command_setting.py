@@ -1,46 +1,30 @@
+from collections.abc import Mapping
 from dataclasses import KW_ONLY, dataclass
+from functools import partial
 from typing import TypeVar
 
 from fastcs.attributes import (  # type: ignore
     AttributeIO,  # type: ignore
     AttributeIORef,  # type: ignore
     AttrR,
-    AttrRW,
     AttrW,
 )
-from fastcs.util import ONCE  # type: ignore
+from fastcs.logging import logger
 
+from fastcs_wpi_micro4.protocol import parse_echo, parse_reply
 from fastcs_wpi_micro4.usb_connection import USBConnection
+from fastcs_wpi_micro4.write_coalescer import WriteCoalescer
 
 NumberT = TypeVar("NumberT", int, float, str)
 
 
-@dataclass
-class WpiMicro4ControllerCommandSettingNameDict:
-    # maps names inserted by the user in the GUI to acuall Commands
-    name_to_symbol = {
-        "Infuse": "I",
-        "Paused": "U",
-        "nL/Sec": "S",
-        "nL/Min": "M",
-        "Non-Grouped": "N",
-        "Grupped": "G",
-        "Disabled": "D",
-        "Max Load Drive": "BT",
-        "Smooth Drive": "BS",
-        "Delivered Volume": "EN",
-        "Remaining Volume": "EI",
-    }
-
-
 @dataclass
 class WpiMicro4ControllerCommandSettingIORef(AttributeIORef):  # type: ignore
     name: str
-    response_prefix: str
     line_num: int
-    pump_atrr_instance: AttrRW  # type: ignore
     _: KW_ONLY
-    update_period: float | None = ONCE  # type: ignore
+    names: Mapping[str, str]  # maps names inserted by the user in the GUI to Commands
+    update_period: float | None = None  # read once by the batched initial sweep
 
 
 # for the settings which only requires command only
@@ -51,42 +35,58 @@ class WpiMicro4ControllerCommandSettingIO(
         super().__init__()  # type: ignore
 
         self._connection = connection
+        # a setpoint put during a write goes out after it, replacing earlier ones
+        self._coalescer = WriteCoalescer()
 
     async def send(
         self,
         attr: AttrW[NumberT, WpiMicro4ControllerCommandSettingIORef],  # type: ignore
         value: NumberT,
     ) -> None:
-        chosen_pump_number = attr.io_ref.pump_atrr_instance.get()  # type: ignore
-        if chosen_pump_number == attr.io_ref.line_num:  # type: ignore
-            command_long = f"{attr.dtype(value)}"
-            command = WpiMicro4ControllerCommandSettingNameDict.name_to_symbol[
-                command_long
-            ]
-            try:
-                r = await self._connection.send_query(f"{command}\r")
-                if "OK" in r:
+        await self._coalescer.write(attr, value, partial(self._write, attr))  # pyright: ignore[reportUnknownMemberType]
+
+    async def _write(
+        self,
+        attr: AttrW[NumberT, WpiMicro4ControllerCommandSettingIORef],  # type: ignore
+        value: NumberT,
+    ) -> None:
+        command_long = f"{attr.dtype(value)}"
+        command = attr.io_ref.names[command_long]  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType, reportUnknownVariableType]
+        try:
+            r = await self._connection.send_query(
+                f"{command}\r",
+                attr.io_ref.line_num,  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType]
+            )
+            if "OK" in r:
+                # readback from the command's echo if the firmware sends one
+                if parse_echo(command, r) is None:  # pyright: ignore[reportUnknownArgumentType]
                     await self.update(attr)  # type: ignore
-            except Exception as e:
-                print(f"error: new line query - {e}")
+                else:
+                    await self.set(r, attr)  # pyright: ignore[reportArgumentType, reportUnknownMemberType]
+        except Exception as e:
+            logger.error("Command write failed", error=str(e))
+
+    def query_message(
+        self,
+        attr: AttrR[NumberT, WpiMicro4ControllerCommandSettingIORef],  # type: ignore
+    ) -> str:
+        return f"?{attr.io_ref.name}\r"  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
 
-    # run once at init stage
+    # initial value is read by the controller's batched sweep
     async def update(
         self,
         attr: AttrR[NumberT, WpiMicro4ControllerCommandSettingIORef],  # type: ignore
     ) -> None:
-        # instead of this check the ine atribute value is same as the line number
-        # if not don't update
-        chosen_pump_number = attr.io_ref.pump_atrr_instance.get()  # type: ignore
-        if chosen_pump_number == attr.io_ref.line_num:  # type: ignore
-            query = f"?{attr.io_ref.name}"  # type: ignore
-            response = await self._connection.send_query(f"{query}\r")
-            if f"{attr.io_ref.response_prefix}" in response:  # type: ignore
-                value_without_prefix = response.replace(
-                    f"{attr.io_ref.response_prefix}",  # type: ignore
-                    "",  # type: ignore
-                )
-                value = value_without_prefix.replace("\n\r>OK\n\r", "")
-                value = value.replace("\n\rOK\n\r", "")
+        response = await self._connection.send_query(
+            self.query_message(attr),
+            attr.io_ref.line_num,  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType]
+        )
+        await self.set(response, attr)  # pyright: ignore[reportUnknownMemberType]
 
-            await attr.update(attr.dtype(value))  # type: ignore
+    async def set(
+        self,
+        response,  # pyright: ignore[reportMissingParameterType, reportUnknownParameterType]
+        attr: AttrR[NumberT, WpiMicro4ControllerCommandSettingIORef],  # type: ignore
+    ):
+        reply = parse_reply(attr.io_ref.name, response)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType]
+        await attr.update(attr.dtype(reply.value))  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
@@ -0,0 +1,45 @@
+from dataclasses import KW_ONLY, dataclass
+
+from fastcs.attributes import (
+    AttributeIO,  # pyright: ignore[reportAttributeAccessIssue, reportUnknownVariableType]
+    AttributeIORef,  # pyright: ignore[reportAttributeAccessIssue, reportUnknownVariableType]
+    AttrW,
+)
+from fastcs.logging import logger
+
+from fastcs_wpi_micro4.usb_connection import USBConnection
+
+
+@dataclass
+class WpiMicro4ControllerEmergencyStopIORef(AttributeIORef):  # pyright: ignore[reportUntypedBaseClass]
+    lines: tuple[int, ...]
+    _: KW_ONLY
+    update_period: float | None = None  # write only
+
+
+# kills the motor of every line, in one transaction that jumps the queued polls
+class WpiMicro4ControllerEmergencyStopIO(
+    AttributeIO[bool, WpiMicro4ControllerEmergencyStopIORef]  # pyright: ignore[reportUntypedBaseClass]
+):
+    def __init__(self, connection: USBConnection):
+        super().__init__()  # pyright: ignore[reportUnknownMemberType]
+
+        self._connection = connection
+
+    async def send(
+        self,
+        attr: AttrW[bool, WpiMicro4ControllerEmergencyStopIORef],  # pyright: ignore[reportInvalidTypeArguments]
+        value: bool,
+    ) -> None:
+        if not value:
+            return
+        fitted = self._connection.fitted_lines
+        lines = [  # pyright: ignore[reportUnknownVariableType]
+            line
+            for line in attr.io_ref.lines  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType, reportUnknownVariableType]
+            if fitted is None or line in fitted
+        ]
+        try:
+            await self._connection.send_line_queries([(line, "Z\r") for line in lines])  # pyright: ignore[reportUnknownVariableType]
+        except Exception as e:
+            logger.error("Emergency stop failed", error=str(e))
@@ -1,55 +1,31 @@
 from dataclasses import KW_ONLY, dataclass
-from typing import TypeVar
 
-from fastcs.attributes import AttributeIO, AttributeIORef, AttrR, AttrW  # type: ignore
-from fastcs.util import ONCE  # type: ignore
+from fastcs.attributes import AttributeIO, AttributeIORef, AttrR  # pyright: ignore[reportAttributeAccessIssue, reportUnknownVariableType]
 
 from fastcs_wpi_micro4.usb_connection import USBConnection
 
-NumberT = TypeVar("NumberT", int, float, str)
-
 
 @dataclass
 class WpiMicro4ControllerLineSettingIORef(AttributeIORef):  # type: ignore
-    command: str
     _: KW_ONLY
-    update_period: float | None = ONCE  # type: ignore
+    update_period: float | None = 1.0
 
 
-# for the settings which require both the command and value
-# query is the same a the comm
+# the line the device has selected, every transaction selects the lines it
+# goes to, so a write of its own would be undone by the next poll
 class WpiMicro4ControllerLineSettingIO(
-    AttributeIO[NumberT, WpiMicro4ControllerLineSettingIORef]  # type: ignore
+    AttributeIO[int, WpiMicro4ControllerLineSettingIORef]  # pyright: ignore[reportUntypedBaseClass]
 ):
     def __init__(self, connection: USBConnection):
         super().__init__()  # type: ignore
 
         self._connection = connection
 
-    async def send(
-        self,
-        attr: AttrW[NumberT, WpiMicro4ControllerLineSettingIORef],  # type: ignore
-        value: NumberT,  # type: ignore
-    ) -> None:
-        command = f"{attr.io_ref.command}{attr.dtype(value)}"  # type: ignore
-        try:
-            r = await self._connection.send_query(f"{command}\r")
-            if "OK" in r:
-                await self.set(value, attr)  # type: ignore
-        except Exception as e:
-            print(f"error: LINE query - {e}")
-
-    # to allow for the initial value to be set
+    # read from the connection, without a query
     async def update(
         self,
-        attr: AttrR[NumberT, WpiMicro4ControllerLineSettingIORef],  # type: ignore
+        attr: AttrR[int, WpiMicro4ControllerLineSettingIORef],  # pyright: ignore[reportInvalidTypeArguments]
     ) -> None:
-        pass
-
-    # rbv set based on the request no query for line number provided
-    async def set(
-        self,
-        value,  # type: ignore
-        attr: AttrR[NumberT, WpiMicro4ControllerLineSettingIORef],  # type: ignore
-    ):
-        await attr.update(attr.dtype(value))  # type: ignore
+        line = self._connection.selected_line
+        if line is not None:
+            await attr.update(line)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
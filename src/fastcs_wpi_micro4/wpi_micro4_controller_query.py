@@ -1,42 +1,83 @@
+from collections.abc import Awaitable, Callable
 from dataclasses import KW_ONLY, dataclass
-from typing import TypeVar
+from typing import Any, TypeVar
 
-from fastcs.attributes import AttributeIO, AttributeIORef, AttrR, AttrRW  # type: ignore
+from fastcs.attributes import AttributeIO, AttributeIORef, AttrR  # pyright: ignore[reportAttributeAccessIssue, reportUnknownVariableType]
 
+from fastcs_wpi_micro4.deadband import Deadband
+from fastcs_wpi_micro4.protocol import parse_reply
+from fastcs_wpi_micro4.units import UnitCache
 from fastcs_wpi_micro4.usb_connection import USBConnection
 
 NumberT = TypeVar("NumberT", int, float, str)
+ReadingCallback = Callable[[Any], Awaitable[None]]
 
 
 @dataclass
 class WpiMicro4ControllerQueryIORef(AttributeIORef):  # type: ignore
     name: str
-    response_prefix: str
     line_num: int
-    pump_atrr_instance: AttrRW  # type: ignore
     _: KW_ONLY
-    update_period: float | None = 0.5
+    update_period: float | None = None  # polled by the controller's scheduler
+    poll_period: float = 0.25  # while the line's motor is running
+    idle_poll_period: float = 5.0  # the counter doesn't move while idle
+    deadband: Deadband | None = None  # None publishes every change
     # needs state atribute to keep updating it too
 
 
 class WpiMicro4ControllerQueryIO(AttributeIO[NumberT, WpiMicro4ControllerQueryIORef]):  # type: ignore
-    def __init__(self, connection: USBConnection):
+    def __init__(self, connection: USBConnection, units: UnitCache | None = None):
         super().__init__()  # type: ignore
 
         self._connection = connection
+        self._units = units
+        # last reading of each attribute with a deadband, published or not
+        self._readings: dict[AttrR, NumberT] = {}  # pyright: ignore[reportGeneralTypeIssues, reportMissingTypeArgument]
+        # loop time the device read the last value of each attribute at
+        self._read_times: dict[AttrR, float] = {}  # pyright: ignore[reportMissingTypeArgument]
+        # of every reading of each attribute, whether it is published or not
+        self._reading_callbacks: dict[AttrR, list[ReadingCallback]] = {}  # pyright: ignore[reportMissingTypeArgument]
 
+    def read_time(self, attr: AttrR) -> float | None:  # pyright: ignore[reportMissingTypeArgument, reportUnknownParameterType]
+        """Midpoint of the exchange of the last reading, None if it isn't known."""
+        return self._read_times.get(attr)  # pyright: ignore[reportUnknownMemberType]
+
+    def add_reading_callback(
+        self,
+        attr: AttrR,  # pyright: ignore[reportMissingTypeArgument, reportUnknownParameterType]
+        callback: ReadingCallback,
+    ) -> None:
+        """Calls ``callback`` with every reading of ``attr``, published or not."""
+        self._reading_callbacks.setdefault(attr, []).append(callback)  # pyright: ignore[reportUnknownMemberType]
+
+    def query_message(self, attr: AttrR[NumberT, WpiMicro4ControllerQueryIORef]) -> str:  # pyright: ignore[reportInvalidTypeArguments]
+        return f"?{attr.io_ref.name}\r"  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+
+    # periodic reads are swept by the controller's poll scheduler
     async def update(self, attr: AttrR[NumberT, WpiMicro4ControllerQueryIORef]) -> None:  # type: ignore
-        chosen_pump_number = attr.io_ref.pump_atrr_instance.get()  # type: ignore
-        if chosen_pump_number == attr.io_ref.line_num:  # type: ignore
-            query = f"?{attr.io_ref.name}"  # type: ignore
-
-            response = await self._connection.send_query(f"{query}\r")
-            if f"{attr.io_ref.response_prefix}" in response:  # type: ignore
-                value = response.strip(f"{attr.io_ref.response_prefix}" + " \n\rOK\n\r")  # type: ignore
-                value = value.replace("\n\r>OK\n\r", "")
-                if "L" in value:
-                    value = value[:-2]  # remove the units as well
-
-                await attr.update(attr.dtype(value))  # type: ignore
-            else:
-                raise Exception("Response doesn't much query")
+        response = await self._connection.send_query(
+            self.query_message(attr),
+            attr.io_ref.line_num,  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType]
+            periodic=True,
+        )
+        await self.set(response, attr)  # pyright: ignore[reportUnknownMemberType]
+
+    async def set(self, response, attr: AttrR[NumberT, WpiMicro4ControllerQueryIORef]):  # pyright: ignore[reportInvalidTypeArguments, reportMissingParameterType, reportUnknownParameterType]
+        reply = parse_reply(attr.io_ref.name, response)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType]
+        value = attr.dtype(reply.value)
+        if self._units is not None:
+            self._units.record_volume_unit(attr, reply.unit)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType]
+        midpoint = getattr(response, "midpoint", None)  # pyright: ignore[reportUnknownArgumentType]
+        if midpoint is not None:
+            self._read_times[attr] = midpoint  # pyright: ignore[reportUnknownMemberType]
+        for callback in self._reading_callbacks.get(attr, ()):  # pyright: ignore[reportUnknownMemberType]
+            await callback(value)
+        deadband = attr.io_ref.deadband  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType, reportUnknownVariableType]
+        if deadband is not None:
+            previous = self._readings.get(attr)  # pyright: ignore[reportUnknownMemberType]
+            self._readings[attr] = value  # pyright: ignore[reportUnknownMemberType]
+            # a repeated reading, e.g. the counter of a pump that has stopped, is
+            # published even within the deadband so the PV settles on it
+            if value != previous and not deadband.exceeded(attr.get(), value):  # pyright: ignore[reportUnknownMemberType]
+                return
+        await attr.update(value)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
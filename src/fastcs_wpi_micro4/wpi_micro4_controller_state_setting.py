@@ -1,3 +1,4 @@
+from collections.abc import Mapping
 from dataclasses import KW_ONLY, dataclass
 from typing import TypeVar
 
@@ -5,80 +6,91 @@ from fastcs.attributes import (
     AttributeIO,  # type: ignore
     AttributeIORef,  # type: ignore
     AttrR,
-    AttrRW,
     AttrW,
 )
+from fastcs.logging import logger
 
+from fastcs_wpi_micro4.poll_scheduler import WpiMicro4PollScheduler
+from fastcs_wpi_micro4.protocol import parse_echo, parse_reply
 from fastcs_wpi_micro4.usb_connection import USBConnection
 
 NumberT = TypeVar("NumberT", int, float, str)
 
 
-@dataclass
-class WpiMicro4ControllerStateSettingNameDict:
-    name_to_symbol = {
-        "Run": "G",
-        "Stop": "H",
-        "Pause": "U",
-    }
-
-
 @dataclass
 class WpiMicro4ControllerStateSettingIORef(AttributeIORef):  # type: ignore
     name: str
-    response_prefix: str
     line_num: int
-    pump_atrr_instance: AttrRW  # type: ignore
     _: KW_ONLY
-    update_period: float | None = 0.5
+    names: Mapping[str, str]  # maps the state names to Commands
+    update_period: float | None = None  # polled by the controller's scheduler
+    poll_period: float = 0.5  # while the line's motor is running
+    idle_poll_period: float = 2.0  # to notice a start from the front panel
 
 
 # state is same a scommand by it is scanned periodically
 class WpiMicro4ControllerStateSettingIO(
     AttributeIO[NumberT, WpiMicro4ControllerStateSettingIORef]  # type: ignore
 ):
-    def __init__(self, connection: USBConnection):
+    def __init__(
+        self,
+        connection: USBConnection,
+        poll_scheduler: WpiMicro4PollScheduler | None = None,
+    ):
         super().__init__()  # type: ignore
 
         self._connection = connection
+        self._poll_scheduler = poll_scheduler
 
     async def send(
         self,
         attr: AttrW[NumberT, WpiMicro4ControllerStateSettingIORef],  # type: ignore
         value: NumberT,
     ) -> None:
-        chosen_pump_number = attr.io_ref.pump_atrr_instance.get()  # type: ignore
-        if chosen_pump_number == attr.io_ref.line_num:  # type: ignore
-            command_long = f"{attr.dtype(value)}"
-            if (
-                command_long
-                in WpiMicro4ControllerStateSettingNameDict.name_to_symbol.keys()
-            ):
-                command = WpiMicro4ControllerStateSettingNameDict.name_to_symbol[
-                    command_long
-                ]
-                try:
-                    r = await self._connection.send_query(f"{command}\r")
-                    if "OK" in r:
-                        await self.update(attr)  # type: ignore
-                except Exception as e:
-                    print(f"error: new line query - {e}")
+        command_long = f"{attr.dtype(value)}"
+        if command_long in attr.io_ref.names:  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+            command = attr.io_ref.names[command_long]  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType, reportUnknownVariableType]
+            try:
+                r = await self._connection.send_query(
+                    f"{command}\r",
+                    attr.io_ref.line_num,  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType]
+                )
+                if "OK" in r:
+                    if self._poll_scheduler is not None:
+                        self._poll_scheduler.burst(attr.io_ref.line_num)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType]
+                    # readback from the command's echo if the firmware sends one,
+                    # else from a query that is never dropped, unlike the polls
+                    if parse_echo(command, r) is None:  # pyright: ignore[reportUnknownArgumentType]
+                        r = await self._connection.send_query(
+                            self.query_message(attr),  # pyright: ignore[reportArgumentType]
+                            attr.io_ref.line_num,  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType]
+                        )
+                    await self.set(r, attr)  # pyright: ignore[reportArgumentType, reportUnknownMemberType]
+            except Exception as e:
+                logger.error("State write failed", error=str(e))
 
-    # run periodically
+    def query_message(
+        self,
+        attr: AttrR[NumberT, WpiMicro4ControllerStateSettingIORef],  # type: ignore
+    ) -> str:
+        return f"?{attr.io_ref.name}\r"  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+
+    # periodic reads are swept by the controller's poll scheduler
     async def update(
         self,
         attr: AttrR[NumberT, WpiMicro4ControllerStateSettingIORef],  # type: ignore
     ) -> None:
-        chosen_pump_number = attr.io_ref.pump_atrr_instance.get()  # type: ignore
-        if chosen_pump_number == attr.io_ref.line_num:  # type: ignore
-            query = f"?{attr.io_ref.name}"  # type: ignore
-            response = await self._connection.send_query(f"{query}\r")
-            if f"{attr.io_ref.response_prefix}" in response:  # type: ignore
-                value_without_prefix = response.replace(
-                    f"{attr.io_ref.response_prefix}",  # type: ignore
-                    "",
-                )
-                value = value_without_prefix.replace("\n\r>OK\n\r", "")
-                value = value.replace("\n\rOK\n\r", "")
+        response = await self._connection.send_query(
+            self.query_message(attr),
+            attr.io_ref.line_num,  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType]
+            periodic=True,
+        )
+        await self.set(response, attr)  # pyright: ignore[reportUnknownMemberType]
 
-            await attr.update(attr.dtype(value))  # type: ignore
+    async def set(
+        self,
+        response,  # pyright: ignore[reportMissingParameterType, reportUnknownParameterType]
+        attr: AttrR[NumberT, WpiMicro4ControllerStateSettingIORef],  # type: ignore
+    ):
+        reply = parse_reply(attr.io_ref.name, response)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType]
+        await attr.update(attr.dtype(reply.value))  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
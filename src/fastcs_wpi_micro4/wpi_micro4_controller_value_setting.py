@@ -1,29 +1,31 @@
 from dataclasses import KW_ONLY, dataclass
+from functools import partial
+from math import isclose
 from typing import TypeVar
 
 from fastcs.attributes import (  # type: ignore
     AttributeIO,  # type: ignore
     AttributeIORef,  # type: ignore
     AttrR,
-    AttrRW,
     AttrW,
 )
-from fastcs.util import ONCE  # type: ignore
+from fastcs.logging import logger
 
+from fastcs_wpi_micro4.protocol import NumberReply, parse_echo, parse_reply
+from fastcs_wpi_micro4.units import UnitCache
 from fastcs_wpi_micro4.usb_connection import USBConnection
+from fastcs_wpi_micro4.write_coalescer import WriteCoalescer
 
 NumberT = TypeVar("NumberT", int, float, str)
 
 
 @dataclass
 class WpiMicro4ControllerValueSettingIORef(AttributeIORef):  # type: ignore
-    command: str
-    query: str
-    response_prefix: str
+    name: str  # query
     line_num: int
-    pump_atrr_instance: AttrRW  # type: ignore
     _: KW_ONLY
-    update_period: float | None = ONCE  # type: ignore
+    command: str
+    update_period: float | None = None  # read once by the batched initial sweep
 
 
 # for the settings which require both the command and value
@@ -31,50 +33,78 @@ class WpiMicro4ControllerValueSettingIORef(AttributeIORef):  # type: ignore
 class WpiMicro4ControllerValueSettingIO(
     AttributeIO[NumberT, WpiMicro4ControllerValueSettingIORef]  # type: ignore
 ):
-    def __init__(self, connection: USBConnection):
+    def __init__(self, connection: USBConnection, units: UnitCache | None = None):
         super().__init__()  # type: ignore
 
         self._connection = connection
+        self._units = units
+        # a setpoint put during a write goes out after it, replacing earlier ones
+        self._coalescer = WriteCoalescer()
 
     async def send(
         self,
         attr: AttrW[NumberT, WpiMicro4ControllerValueSettingIORef],  # type: ignore
         value: NumberT,  # type: ignore
     ) -> None:
-        chosen_pump_number = attr.io_ref.pump_atrr_instance.get()  # type: ignore
-        if chosen_pump_number == attr.io_ref.line_num:  # type: ignore
-            command = f"{attr.io_ref.command}{attr.dtype(value)}"  # type: ignore
-            try:
-                r = await self._connection.send_query(f"{command}\r")
-                if "OK" in r:
+        await self._coalescer.write(attr, value, partial(self._write, attr))  # pyright: ignore[reportUnknownMemberType]
+
+    async def _write(
+        self,
+        attr: AttrW[NumberT, WpiMicro4ControllerValueSettingIORef],  # type: ignore
+        value: NumberT,  # type: ignore
+    ) -> None:
+        command = f"{attr.io_ref.command}{attr.dtype(value)}"  # type: ignore
+        try:
+            r = await self._connection.send_query(
+                f"{command}\r",
+                attr.io_ref.line_num,  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType]
+            )
+            if "OK" in r:
+                # readback from the command's own reply, R has been seen
+                # answering with another value so the echo has to agree
+                reply = parse_echo(attr.io_ref.command, r)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType]
+                if reply is not None and isclose(
+                    reply.value,  # pyright: ignore[reportArgumentType]
+                    attr.dtype(value),  # pyright: ignore[reportArgumentType]
+                    rel_tol=1e-3,
+                    abs_tol=0.05,
+                ):
+                    await self._update(attr, reply)  # pyright: ignore[reportArgumentType]
+                else:
                     await self.update(attr)  # type: ignore
-                # This could work for R and V
-                # But R is now returning wrong responce
-                # await self.set(r, attr)
-            except Exception as e:
-                print(f"error: LINE query - {e}")
+        except Exception as e:
+            logger.error("Setpoint write failed", error=str(e))
 
-    # run once at init stage
+    def query_message(
+        self,
+        attr: AttrR[NumberT, WpiMicro4ControllerValueSettingIORef],  # type: ignore
+    ) -> str:
+        return f"?{attr.io_ref.name}\r"  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+
+    # initial value is read by the controller's batched sweep
     async def update(
         self,
         attr: AttrR[NumberT, WpiMicro4ControllerValueSettingIORef],  # type: ignore
     ) -> None:
-        chosen_pump_number = attr.io_ref.pump_atrr_instance.get()  # type: ignore
-        if chosen_pump_number == attr.io_ref.line_num:  # type: ignore
-            query = f"?{attr.io_ref.query}"  # type: ignore
-            response = await self._connection.send_query(f"{query}\r")
-            await self.set(response, attr)  # type: ignore
+        response = await self._connection.send_query(
+            self.query_message(attr),
+            attr.io_ref.line_num,  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType]
+        )
+        await self.set(response, attr)  # type: ignore
 
     async def set(
         self,
         response,  # type: ignore
         attr: AttrR[NumberT, WpiMicro4ControllerValueSettingIORef],  # type: ignore
     ):
-        if f"{attr.io_ref.response_prefix}" in response:  # type: ignore
-            value = response.strip(f">{attr.io_ref.response_prefix}" + " \n\rOK\n\r")  # type: ignore
-            value = value.replace("\n\r>OK\n\r", "")  # type: ignore
-            if "L" in value:
-                value = value[:-2]  # type: ignore # remove the units as well
-            await attr.update(attr.dtype(value))  # type: ignore
-        else:
-            raise Exception("Response doesn't match query")
+        reply = parse_reply(attr.io_ref.name, response)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType]
+        await self._update(attr, reply)  # pyright: ignore[reportArgumentType]
+
+    async def _update(
+        self,
+        attr: AttrR[NumberT, WpiMicro4ControllerValueSettingIORef],  # type: ignore
+        reply: NumberReply,
+    ):
+        if self._units is not None:
+            self._units.record_volume_unit(attr, reply.unit)  # pyright: ignore[reportUnknownMemberType]
+        await attr.update(attr.dtype(reply.value))  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
@@ -0,0 +1,82 @@
+import time
+
+import numpy as np
+from fastcs.attributes import AttrR
+from fastcs.controllers import Controller
+from fastcs.datatypes import Float, Int, Waveform
+from fastcs.methods import scan  # pyright: ignore[reportUnknownVariableType]
+
+from fastcs_wpi_micro4.link_statistics import REPLY_TIME_BUCKETS, LinkStatistics
+from fastcs_wpi_micro4.protocol import REPLY_TABLE
+
+DIAGNOSTICS_PERIOD = 1.0
+# histograms published, one per query letter, L for line switches, W for writes
+REPLY_KINDS = (*REPLY_TABLE, "L", "W")
+
+
+class WpiMicro4DiagnosticsController(Controller):
+    """Publishes the statistics of the serial link as PVs."""
+
+    def __init__(self, statistics: LinkStatistics):
+        super().__init__()  # pyright: ignore[reportUnknownMemberType]
+        self._statistics = statistics
+        self._last_publish = (time.perf_counter(), 0, 0)
+
+        self.transactions = AttrR(Int())
+        self.pending = AttrR(Int())
+        self.pending_max = AttrR(Int())
+        self.coalesced_polls = AttrR(Int())
+        self.dropped_polls = AttrR(Int())
+        self.lock_wait_mean = AttrR(Float(units="ms", prec=2))
+        self.lock_wait_max = AttrR(Float(units="ms", prec=2))
+        self.bytes_sent = AttrR(Int())
+        self.bytes_received = AttrR(Int())
+        self.send_rate = AttrR(Float(units="B/s", prec=1))
+        self.receive_rate = AttrR(Float(units="B/s", prec=1))
+        self.error_replies = AttrR(Int())
+        self.timeouts = AttrR(Int())
+        self.misaligned = AttrR(Int())
+        self.link_losses = AttrR(Int())
+        # upper edges of the reply time histograms, the last bucket is the overflow
+        self.reply_time_buckets = AttrR(
+            Waveform(np.float64, shape=(len(REPLY_TIME_BUCKETS),)),
+            initial_value=np.array(REPLY_TIME_BUCKETS) * 1e3,
+        )
+        self._histograms: dict[str, AttrR] = {}  # pyright: ignore[reportMissingTypeArgument]
+        self._published: dict[str, list[int]] = {}
+        for kind in REPLY_KINDS:
+            attr = AttrR(Waveform(np.int64, shape=(len(REPLY_TIME_BUCKETS) + 1,)))
+            setattr(self, f"reply_times_{kind.lower()}", attr)
+            self._histograms[kind] = attr  # pyright: ignore[reportUnknownMemberType]
+
+    @scan(DIAGNOSTICS_PERIOD)  # pyright: ignore[reportUntypedFunctionDecorator]
+    async def publish(self):
+        statistics = self._statistics
+        now = time.perf_counter()
+        last_time, last_sent, last_received = self._last_publish
+        elapsed = now - last_time
+        self._last_publish = (now, statistics.bytes_sent, statistics.bytes_received)
+
+        await self.transactions.update(statistics.transactions)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        await self.pending.update(statistics.pending)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        await self.pending_max.update(statistics.pending_max)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        await self.coalesced_polls.update(statistics.coalesced_polls)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        await self.dropped_polls.update(statistics.dropped_polls)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        await self.lock_wait_mean.update(statistics.lock_wait_mean * 1e3)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        await self.lock_wait_max.update(statistics.lock_wait_max * 1e3)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        await self.bytes_sent.update(statistics.bytes_sent)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        await self.bytes_received.update(statistics.bytes_received)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        await self.send_rate.update((statistics.bytes_sent - last_sent) / elapsed)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        await self.receive_rate.update(  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+            (statistics.bytes_received - last_received) / elapsed
+        )
+        await self.error_replies.update(statistics.error_replies)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        await self.timeouts.update(statistics.timeouts)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        await self.misaligned.update(statistics.misaligned)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        await self.link_losses.update(statistics.link_losses)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        for kind, histogram in statistics.reply_times.items():
+            attr = self._histograms.get(kind)  # pyright: ignore[reportUnknownMemberType, reportUnknownVariableType]
+            # only the histograms that have changed are converted to arrays
+            if attr is not None and histogram != self._published.get(kind):
+                self._published[kind] = histogram.copy()
+                await attr.update(np.array(histogram))  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
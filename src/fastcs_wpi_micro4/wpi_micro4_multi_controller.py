@@ -0,0 +1,46 @@
+import asyncio
+from collections.abc import Mapping
+
+from fastcs.controllers import Controller
+
+from fastcs_wpi_micro4.deadband import Deadband
+from fastcs_wpi_micro4.usb_connection import USBConnectionSettings
+from fastcs_wpi_micro4.volume_estimator import ESTIMATE_PERIOD
+from fastcs_wpi_micro4.wpi_micro4_controller import WpiMicro4Controller
+
+
+class WpiMicro4MultiController(Controller):
+    """Serves several Micro4 controllers from one IOC.
+
+    Every pump is a sub-controller, named by its PV sub-prefix, with its own serial
+    link, poll scheduler and supervisor. The pumps share the event loop and the
+    scan tick, but each pump's sweep runs on its own, so a slow or failing link
+    delays only the polls of its pump.
+    """
+
+    def __init__(
+        self,
+        pumps: dict[str, USBConnectionSettings],
+        deadbands: Mapping[str, Deadband] | None = None,
+        estimate_period: float = ESTIMATE_PERIOD,
+    ):
+        super().__init__()  # pyright: ignore[reportUnknownMemberType]
+        self.pumps: dict[str, WpiMicro4Controller] = {}
+        for name, settings in pumps.items():
+            pump = WpiMicro4Controller(
+                settings, deadbands=deadbands, estimate_period=estimate_period
+            )
+            self.add_sub_controller(name, pump)  # pyright: ignore[reportUnknownMemberType]
+            self.pumps[name] = pump
+
+    async def initialise(self):
+        await asyncio.gather(*(pump.initialise() for pump in self.pumps.values()))
+
+    async def connect(self):
+        # a pump that can't be reached comes up disconnected, its supervisor keeps
+        # trying without keeping the others down
+        await asyncio.gather(*(pump.connect() for pump in self.pumps.values()))
+        self._connected = True
+
+    async def disconnect(self):
+        await asyncio.gather(*(pump.disconnect() for pump in self.pumps.values()))
@@ -0,0 +1,63 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from fastcs.attributes import AttrW
+
+
+class WriteCoalescer:
+    """Sends the writes of each attribute one at a time, skipping superseded ones.
+
+    A setpoint put while a write of the same attribute is in flight replaces any
+    other still waiting, so a slider dragged through many values sends the first
+    and the last instead of queueing every one behind the serial lock. The puts
+    superseded return once the write of the value that replaced them is done.
+    """
+
+    def __init__(self):
+        # attributes with a write in flight
+        self._writing: set[AttrW] = set()  # pyright: ignore[reportMissingTypeArgument]
+        # latest setpoint waiting for the write in flight, with the future of its
+        # write, shared by every put it superseded
+        self._waiting: dict[AttrW, tuple[Any, asyncio.Future[None]]] = {}  # pyright: ignore[reportMissingTypeArgument]
+
+    async def write(
+        self,
+        attr: AttrW,  # pyright: ignore[reportMissingTypeArgument, reportUnknownParameterType]
+        value: Any,
+        send: Callable[[Any], Awaitable[None]],
+    ) -> None:
+        if attr in self._writing:  # pyright: ignore[reportUnknownMemberType]
+            waiting = self._waiting.get(attr)  # pyright: ignore[reportUnknownMemberType]
+            done = (
+                asyncio.get_running_loop().create_future()
+                if waiting is None
+                else waiting[1]
+            )
+            self._waiting[attr] = (value, done)  # pyright: ignore[reportUnknownMemberType]
+            # a put cancelled doesn't cancel the write of the others
+            await asyncio.shield(done)
+            return
+        self._writing.add(attr)  # pyright: ignore[reportUnknownMemberType]
+        done = None
+        try:
+            await send(value)
+            while attr in self._waiting:  # pyright: ignore[reportUnknownMemberType]
+                value, done = self._waiting.pop(attr)  # pyright: ignore[reportUnknownMemberType]
+                await send(value)
+                done.set_result(None)
+                done = None
+        except BaseException as e:
+            # the puts waiting fail with the write in flight
+            waiting = self._waiting.pop(attr, None)  # pyright: ignore[reportUnknownMemberType]
+            for future in (done, waiting and waiting[1]):
+                if future is None:
+                    continue
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+                    future.exception()  # retrieved, if its puts were cancelled
+            raise
+        finally:
+            self._writing.discard(attr)  # pyright: ignore[reportUnknownArgumentType, reportUnknownMemberType]
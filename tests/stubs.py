@@ -0,0 +1,44 @@
+"""Stand-ins for the connection and IOs of the poll and write tests."""
+
+import asyncio
+
+from fastcs.attributes import AttrR
+
+
+class StubLineConnection:
+    """Answers the line queries of a poll sweep, recording every batch of them."""
+
+    def __init__(self):
+        self.batches: list[list[tuple[int | None, str]]] = []
+        self.fitted_lines: tuple[int, ...] | None = None
+
+    async def send_line_queries(
+        self, queries: list[tuple[int | None, str]], periodic: bool = False
+    ) -> list[str]:
+        self.batches.append(queries)
+        return [f"{message.strip()}{line}>reply" for line, message in queries]
+
+
+class StubReplyConnection:
+    """Answers every query from a table of replies, recording the messages."""
+
+    def __init__(self, replies: dict[str, str], delay: float = 0.0):
+        self.replies = replies
+        self.delay = delay  # of every reply
+        self.messages: list[str] = []
+
+    async def send_query(self, message: str, line: int | None = None) -> str:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.messages.append(message)
+        return self.replies[message]
+
+
+class StubIO:
+    """Queries ``?X`` for the attribute of IORef name ``X``, and sets its reply."""
+
+    def query_message(self, attr: AttrR) -> str:  # pyright: ignore[reportMissingTypeArgument, reportUnknownParameterType]
+        return f"?{attr.io_ref.name}\r"  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+
+    async def set(self, response: str, attr: AttrR):  # pyright: ignore[reportMissingTypeArgument, reportUnknownParameterType]
+        await attr.update(response)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
@@ -0,0 +1,25 @@
+import asyncio
+
+from fastcs_wpi_micro4.command_table import LINE_ATTRIBUTES
+from fastcs_wpi_micro4.protocol import ERROR_REPLY, REPLY_TABLE, parse_reply
+from fastcs_wpi_micro4.simulator import WpiMicro4Simulator
+
+
+def test_every_query_has_a_reply_pattern():
+    assert {spec.query for spec in LINE_ATTRIBUTES} <= REPLY_TABLE.keys()
+
+
+def test_every_mapped_value_is_a_command_the_device_takes_and_reads_back():
+    async def run():
+        simulator = WpiMicro4Simulator()
+        for spec in LINE_ATTRIBUTES:
+            for value, command in (spec.names or {}).items():
+                if spec.command is not None:
+                    command = f"{spec.command}{command}"
+                assert simulator.handle(command) != ERROR_REPLY, command
+                if spec.query == "G":
+                    continue  # Run, Stop and Kill all read back as motor states
+                reply = parse_reply(spec.query, simulator.handle(f"?{spec.query}"))
+                assert reply.value == value, command
+
+    asyncio.run(run())
@@ -0,0 +1,115 @@
+import asyncio
+import socket
+
+from fastcs_wpi_micro4.connection_supervisor import WpiMicro4ConnectionSupervisor
+from fastcs_wpi_micro4.simulator import WpiMicro4Simulator
+from fastcs_wpi_micro4.usb_connection import USBConnection, USBConnectionSettings
+from fastcs_wpi_micro4.wpi_micro4_controller import WpiMicro4Controller
+
+
+def unused_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_controller_comes_up_disconnected_and_connects_once_the_device_is_there():
+    simulator = WpiMicro4Simulator(baudrate=None)
+    simulator.lines[0].rate = 5.0
+    port = unused_port()
+
+    async def run():
+        url = f"socket://127.0.0.1:{port}"
+        controller = WpiMicro4Controller(USBConnectionSettings(url), lines=(1, 2))
+        controller._supervisor._backoff = 0.01  # pyright: ignore[reportPrivateUsage]
+        await controller.connect()
+        await asyncio.sleep(0.02)
+        assert controller.connection_status.get() == "Disconnected"
+
+        server = await simulator.start_tcp(port=port)
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if controller.connection_status.get() == "Connected":
+                break
+        await controller.disconnect()
+        server.close()
+        return controller
+
+    controller = asyncio.run(run())
+    assert controller.connection_status.get() == "Connected"
+    assert controller.delivery_rate_l1.get() == 5.0  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+    assert controller.pump_state_l1.get() == "Stopped"  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+
+
+def test_controller_reconnects_and_refreshes_after_the_link_is_lost():
+    simulator = WpiMicro4Simulator(baudrate=None)
+
+    async def run():
+        server = await simulator.start_tcp()
+        url = f"socket://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        controller = WpiMicro4Controller(USBConnectionSettings(url), lines=(1, 2))
+        controller._supervisor._backoff = 0.01  # pyright: ignore[reportPrivateUsage]
+        await controller.connect()
+        await asyncio.sleep(0)
+
+        simulator.drop_clients()
+        simulator.lines[0].rate = 5.0  # changed while the link was down
+        await asyncio.sleep(0.05)
+        controller._poll_scheduler.burst(1)  # pyright: ignore[reportPrivateUsage]
+        await controller.poll_once()  # finds the link lost
+        assert not controller.connection.connected
+        await asyncio.sleep(0)
+        # the polls wait for the supervisor
+        await controller.poll()
+        assert controller._sweep is None  # pyright: ignore[reportPrivateUsage]
+
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if controller.connection_status.get() == "Connected":
+                break
+        transactions = controller.connection.statistics.transactions
+        controller._poll_scheduler.burst(1)  # pyright: ignore[reportPrivateUsage]
+        await controller.poll()
+        await asyncio.sleep(0.05)
+        assert controller.connection.statistics.transactions > transactions
+        await controller.disconnect()
+        server.close()
+        return controller
+
+    controller = asyncio.run(run())
+    assert controller.reconnect_count.get() == 1
+    assert 0 < controller.downtime.get() < 1
+    assert controller.delivery_rate_l1.get() == 5.0  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+    assert controller.pump_state_l1.get() == "Stopped"  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+
+
+def test_supervisor_keeps_trying_whatever_the_reconnect_fails_with():
+    simulator = WpiMicro4Simulator(baudrate=None)
+    failures = [RuntimeError("refresh failed")]
+
+    async def refresh():
+        if failures:
+            raise failures.pop()
+
+    async def run():
+        server = await simulator.start_tcp()
+        url = f"socket://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        settings = USBConnectionSettings(url)
+        connection = USBConnection()
+        supervisor = WpiMicro4ConnectionSupervisor(
+            connection, settings, refresh, backoff=0.01
+        )
+        supervisor.start()
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if supervisor.status.get() == "Connected":
+                break
+        await supervisor.stop()
+        await connection.close()
+        server.close()
+        return supervisor
+
+    supervisor = asyncio.run(run())
+    assert not failures
+    assert supervisor.status.get() == "Connected"
+    assert supervisor.reconnect_count.get() == 1
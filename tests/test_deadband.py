@@ -0,0 +1,58 @@
+import asyncio
+
+from fastcs.attributes import AttrR
+from fastcs.datatypes import Float
+
+from fastcs_wpi_micro4.deadband import Deadband
+from fastcs_wpi_micro4.usb_connection import TimedReply, USBConnectionSettings
+from fastcs_wpi_micro4.wpi_micro4_controller import WpiMicro4Controller
+from fastcs_wpi_micro4.wpi_micro4_controller_query import (
+    WpiMicro4ControllerQueryIO,
+    WpiMicro4ControllerQueryIORef,
+)
+
+
+def test_counter_is_published_past_its_deadband_and_once_it_settles():
+    io = WpiMicro4ControllerQueryIO(None)  # pyright: ignore[reportArgumentType]
+    attr = AttrR(  # pyright: ignore[reportUnknownVariableType]
+        Float(),
+        io_ref=WpiMicro4ControllerQueryIORef("C", 1, deadband=Deadband(absolute=1.0)),  # pyright: ignore[reportCallIssue]
+    )
+    published: list[float] = []
+
+    async def on_update(value: float):
+        published.append(value)
+
+    attr.add_on_update_callback(on_update)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+
+    async def run():
+        for counter in (0.0, 0.4, 0.8, 1.2, 1.3, 1.3, 1.3):
+            await io.set(f"?C>Volume Counter = {counter}nL \n\rOK\n\r", attr)  # pyright: ignore[reportUnknownArgumentType, reportUnknownMemberType]
+
+    asyncio.run(run())
+
+    assert published == [1.2, 1.3]
+
+
+def test_measured_rate_follows_the_readings_within_the_counter_deadband():
+    controller = WpiMicro4Controller(
+        USBConnectionSettings(),
+        lines=(1,),
+        deadbands={"volume_couner_l": Deadband(absolute=5.0)},
+    )
+    counter = controller.volume_couner_l1  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType, reportUnknownVariableType]
+    io = controller._ios[WpiMicro4ControllerQueryIORef]  # pyright: ignore[reportPrivateUsage, reportUnknownMemberType]
+
+    async def run():
+        await controller.pump_state_l1.update("Running")  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        # 2 nL/s, polled every 0.25 s, so every step is within the deadband
+        for i in range(13):
+            reply = TimedReply(f"?C>Volume Counter = {0.5 * i}nL \n\rOK\n\r")
+            reply.midpoint = 0.25 * i
+            await io.set(reply, counter)  # pyright: ignore[reportUnknownArgumentType, reportUnknownMemberType]
+
+    asyncio.run(run())
+
+    assert counter.get() == 5.5  # pyright: ignore[reportUnknownMemberType]
+    assert controller.volume_couner_nl_l1.get() == 6.0  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+    assert round(controller.measured_rate_l1.get(), 2) == 2.0  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType]
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from fastcs_wpi_micro4.simulator import WpiMicro4Simulator
+from fastcs_wpi_micro4.usb_connection import (
+    ResponseTimeoutError,
+    USBConnectionSettings,
+)
+from fastcs_wpi_micro4.wpi_micro4_controller import WpiMicro4Controller
+
+
+def test_diagnostics_publish_the_link_statistics():
+    simulator = WpiMicro4Simulator(baudrate=None)
+
+    async def run():
+        server = await simulator.start_tcp()
+        url = f"socket://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        controller = WpiMicro4Controller(USBConnectionSettings(url), lines=(1, 2))
+        await controller.connect()
+        await controller.poll_once()
+        simulator.corrupt_replies = 1
+        with pytest.raises(ResponseTimeoutError):
+            await controller.connection.send_query("?G\r", 1)
+        await controller.diagnostics.publish()
+        await controller.disconnect()
+        server.close()
+        return controller.diagnostics
+
+    diagnostics = asyncio.run(run())
+    # line probes, sweep and the lost ?G, nothing is due a poll after the sweep
+    assert diagnostics.transactions.get() == 4
+    assert diagnostics.pending.get() == 0
+    assert diagnostics.timeouts.get() == 1
+    assert diagnostics.reply_times_c.get().sum() == 2  # polled on both lines  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+    assert diagnostics.reply_times_l.get().sum() == 3  # probes, one switch to L1  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+    assert diagnostics.bytes_sent.get() > 0
+    assert diagnostics.bytes_received.get() > 0
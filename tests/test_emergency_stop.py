@@ -0,0 +1,76 @@
+import asyncio
+
+from fastcs_wpi_micro4.simulator import WpiMicro4Simulator
+from fastcs_wpi_micro4.usb_connection import (
+    PRIORITY_URGENT,
+    PriorityLock,
+    USBConnectionSettings,
+)
+from fastcs_wpi_micro4.wpi_micro4_controller import WpiMicro4Controller
+
+
+def test_urgent_waiter_takes_the_lock_ahead_of_queued_ones():
+    lock = PriorityLock()
+    order: list[str] = []
+
+    async def hold(name: str, priority: int | None = None):
+        await (lock.acquire() if priority is None else lock.acquire(priority))
+        order.append(name)
+        await asyncio.sleep(0)
+        lock.release()
+
+    async def run():
+        await lock.acquire()
+        tasks = [asyncio.create_task(hold(f"poll{i}")) for i in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(hold("stop", PRIORITY_URGENT)))
+        await asyncio.sleep(0)
+        lock.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == ["stop", "poll0", "poll1", "poll2"]
+    assert not lock.locked()
+
+
+def test_emergency_stop_reaches_the_wire_ahead_of_queued_polls():
+    simulator = WpiMicro4Simulator(baudrate=9600)
+    for line in simulator.lines:
+        line.motor_state = "Running"
+        line.target_volume = 1e6
+
+    async def run():
+        server = await simulator.start_tcp()
+        url = f"socket://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        controller = WpiMicro4Controller(USBConnectionSettings(url), lines=(1, 2))
+        controller.post_initialise()  # pyright: ignore[reportUnknownMemberType]
+        await controller.connection.connect(USBConnectionSettings(url))
+
+        writer = controller.connection._connection.writer  # pyright: ignore[reportPrivateUsage]
+        write = writer.write
+        writes: list[bytes] = []
+
+        def recorded_write(data: bytes):
+            writes.append(data)
+            write(data)
+
+        writer.write = recorded_write  # pyright: ignore[reportAttributeAccessIssue]
+        polls = [
+            asyncio.create_task(controller.connection.send_query("?C\r", 1))
+            for _ in range(8)
+        ]
+        await asyncio.sleep(0)  # the first poll is in flight, the rest queued
+        await controller.emergency_stop.put(True)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        await asyncio.gather(*polls)
+        await controller.connection.close()
+        server.close()
+        return writes
+
+    writes = asyncio.run(run())
+    stop_index = next(i for i, write in enumerate(writes) if b"Z\r" in write)
+    # behind the in-flight ?C exchange only, ahead of the 7 polls queued
+    assert stop_index == 1
+    assert writes[stop_index] == b"Z\rL2\rZ\r"  # line 1 is selected by the first poll
+    assert len(writes) == 9
+    assert all(b"?C\r" in write for write in writes[:1] + writes[2:])
+    assert [line.motor_state for line in simulator.lines] == ["Stopped", "Stopped"]
@@ -0,0 +1,64 @@
+import asyncio
+
+import numpy as np
+from fastcs.attributes import AttrR
+from fastcs.datatypes import Float, String
+
+from fastcs_wpi_micro4.line_history import LineHistory
+
+
+def make_history(length: int = 8) -> tuple[LineHistory, AttrR]:  # pyright: ignore[reportMissingTypeArgument, reportUnknownParameterType]
+    motor_state = AttrR(String(), initial_value="Running")
+    history = LineHistory(AttrR(Float()), motor_state, length)
+    return history, motor_state
+
+
+def test_ring_keeps_the_latest_readings_oldest_first():
+    history, _ = make_history(length=4)  # pyright: ignore[reportUnknownVariableType]
+    for i in range(6):
+        history.record(float(i), at=float(i))
+
+    times, volumes, states = history.history()
+
+    assert list(volumes) == [2.0, 3.0, 4.0, 5.0]
+    assert list(times) == [2.0, 3.0, 4.0, 5.0]
+    assert list(states) == [1, 1, 1, 1]
+
+
+def test_flow_rate_is_fitted_to_the_current_run():
+    history, motor_state = make_history()  # pyright: ignore[reportUnknownVariableType]
+
+    async def run():
+        await motor_state.update("Stopped")  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        history.record(100.0, at=0.0)
+        await motor_state.update("Running")  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        # the counter restarted with the run, noisy around 2 nL/s
+        for at, volume in ((1.0, 0.0), (2.0, 2.1), (3.0, 3.9), (4.0, 6.0)):
+            history.record(volume, at)
+
+    asyncio.run(run())
+
+    assert round(history.flow_rate(), 2) == 1.98
+
+
+def test_flow_rate_is_zero_once_the_motor_stops():
+    history, motor_state = make_history()  # pyright: ignore[reportUnknownVariableType]
+    history.record(0.0, at=0.0)
+    history.record(2.0, at=1.0)
+    asyncio.run(motor_state.update("Stopped"))  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType]
+    history.record(2.0, at=2.0)
+
+    assert history.flow_rate() == 0.0
+
+
+def test_history_waveforms_are_published_relative_to_now():
+    history, _ = make_history(length=4)  # pyright: ignore[reportUnknownVariableType]
+    history.record(1.0, at=10.0)
+    history.record(2.0, at=11.0)
+
+    asyncio.run(history.publish(12.0))
+
+    assert np.array_equal(
+        history.times.get(), [np.nan, np.nan, -2.0, -1.0], equal_nan=True
+    )
+    assert list(history.states.get()) == [-1, -1, 1, 1]
@@ -0,0 +1,76 @@
+import asyncio
+
+from fastcs.attributes import AttrR
+from fastcs.datatypes import String
+
+from fastcs_wpi_micro4.link_budget import (
+    EXCHANGE_BYTES,
+    LinkBudget,
+    PlannedPoll,
+)
+from fastcs_wpi_micro4.poll_scheduler import WpiMicro4PollScheduler
+from fastcs_wpi_micro4.wpi_micro4_controller_query import (
+    WpiMicro4ControllerQueryIORef,
+)
+from stubs import StubIO, StubLineConnection
+
+
+def test_exchange_bytes_come_from_the_expected_replies():
+    # "?C\r" and "?C>Volume Counter = 12.1nL \n\rOK\n\r" padded by 4 digits
+    assert EXCHANGE_BYTES["C"] == 3 + 33 + 4
+    assert set(EXCHANGE_BYTES) == set("VRCDGUMBES")
+
+
+def test_plan_within_the_budget_is_not_stretched():
+    budget = LinkBudget(9600)
+    polls = [PlannedPoll(1, "C", 0.25, 0), PlannedPoll(1, "G", 0.5, 1)]
+
+    stretches, utilisation = budget.fit(polls)
+
+    assert stretches == {0: 1.0, 1: 1.0}
+    assert round(utilisation, 3) == round((40 / 0.25 + 33 / 0.5) / 960, 3)
+
+
+def test_lowest_priority_is_stretched_first_to_leave_writes_headroom():
+    budget = LinkBudget(9600)
+    polls = [
+        PlannedPoll(line, query, period, priority)
+        for line in (1, 2, 3, 4)
+        for query, period, priority in (("C", 0.25, 0), ("G", 0.5, 1))
+    ]
+
+    stretches, utilisation = budget.fit(polls)
+
+    assert stretches[0] > 1.0
+    assert stretches[1] == 1.0
+    assert round(utilisation, 6) == budget.max_utilisation
+
+
+def test_every_priority_is_stretched_once_the_lowest_is_at_its_limit():
+    budget = LinkBudget(1200)
+    polls = [PlannedPoll(1, "C", 0.25, 0), PlannedPoll(1, "G", 0.25, 1)]
+
+    stretches, utilisation = budget.fit(polls)
+
+    assert stretches[0] > stretches[1] > 1.0
+    assert round(utilisation, 6) == budget.max_utilisation
+
+
+def test_scheduler_stretches_its_periods_and_publishes_the_utilisation():
+    stub_io = StubIO()
+    budget = LinkBudget(2400)
+    scheduler = WpiMicro4PollScheduler(StubLineConnection(), budget)  # pyright: ignore[reportArgumentType]
+    for line in (1, 2):
+        attr = AttrR(String(), io_ref=WpiMicro4ControllerQueryIORef("C", line))  # pyright: ignore[reportCallIssue, reportUnknownVariableType]
+        scheduler.add(attr, stub_io, 0.25)  # pyright: ignore[reportUnknownMemberType]
+
+    async def run():
+        scheduler.mark_read(asyncio.get_running_loop().time())
+        await scheduler.tick()
+
+    asyncio.run(run())
+
+    entry = scheduler._entries[0]  # pyright: ignore[reportPrivateUsage]
+    # (40 + 11) bytes every 0.25 s on each line is 170% of 240 bytes/s
+    assert round(scheduler.period(entry), 3) == round(0.25 * 1.7 / 0.7, 3)
+    assert budget.utilisation.get() == 70.0
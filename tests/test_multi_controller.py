@@ -0,0 +1,108 @@
+import asyncio
+import socket
+
+from fastcs_wpi_micro4.simulator import WpiMicro4Simulator
+from fastcs_wpi_micro4.usb_connection import USBConnectionSettings
+from fastcs_wpi_micro4.wpi_micro4_controller import WpiMicro4Controller
+from fastcs_wpi_micro4.wpi_micro4_multi_controller import WpiMicro4MultiController
+
+
+def unused_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def serve(
+    simulators: list[WpiMicro4Simulator], missing: bool = False
+) -> tuple[WpiMicro4MultiController, list[asyncio.Server]]:
+    servers = [await simulator.start_tcp() for simulator in simulators]
+    pumps = {
+        f"P{i + 1}": USBConnectionSettings(
+            f"socket://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        )
+        for i, server in enumerate(servers)
+    }
+    if missing:
+        pumps["MISSING"] = USBConnectionSettings(f"socket://127.0.0.1:{unused_port()}")
+    controller = WpiMicro4MultiController(pumps)
+    await controller.initialise()
+    controller.post_initialise()  # pyright: ignore[reportUnknownMemberType]
+    await controller.connect()
+    return controller, servers
+
+
+def make_due(pump: WpiMicro4Controller):
+    for entry in pump._poll_scheduler._entries:  # pyright: ignore[reportPrivateUsage]
+        entry.next_due = 0
+
+
+def test_pumps_are_polled_concurrently():
+    simulators = [WpiMicro4Simulator(baudrate=9600) for _ in range(3)]
+    # loop time each simulator handled the queries of the sweep at
+    handled: list[list[float]] = [[] for _ in simulators]
+    for rate, simulator in enumerate(simulators):
+        simulator.lines[0].rate = rate + 1.5
+
+    def record(simulator: WpiMicro4Simulator, times: list[float]):
+        handle = simulator.handle
+
+        def recorded(message: str) -> str:
+            if message.startswith("?"):
+                times.append(asyncio.get_running_loop().time())
+            return handle(message)
+
+        simulator.handle = recorded
+
+    async def run():
+        controller, servers = await serve(simulators, missing=True)
+        for simulator, times in zip(simulators, handled, strict=True):
+            record(simulator, times)
+        for pump in controller.pumps.values():
+            make_due(pump)
+        await asyncio.gather(*(pump.poll_once() for pump in controller.pumps.values()))
+        await controller.disconnect()
+        for server in servers:
+            server.close()
+        return controller
+
+    controller = asyncio.run(run())
+    for i in range(3):
+        assert controller.pumps[f"P{i + 1}"].delivery_rate_l1.get() == i + 1.5  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+    assert controller.pumps["P1"].connection_status.get() == "Connected"
+    assert controller.pumps["MISSING"].connection_status.get() == "Disconnected"
+    # every link was answering the sweep of its pump while the others were
+    assert all(len(times) > 1 for times in handled)
+    assert max(times[0] for times in handled) < min(times[-1] for times in handled)
+
+
+def test_a_stalled_link_holds_up_only_the_polls_of_its_pump():
+    simulators = [WpiMicro4Simulator(baudrate=None) for _ in range(2)]
+    ticks = {"P1": 0, "P2": 0}
+
+    async def run():
+        controller, servers = await serve(simulators)
+        for name, pump in controller.pumps.items():
+            tick = pump._poll_scheduler.tick  # pyright: ignore[reportPrivateUsage]
+
+            async def counted_tick(name: str = name, tick=tick):  # pyright: ignore[reportMissingParameterType, reportUnknownParameterType]
+                await tick()
+                ticks[name] += 1
+
+            pump._poll_scheduler.tick = counted_tick  # pyright: ignore[reportPrivateUsage]
+        # P2 answers too slowly for its sweep to finish within the run
+        simulators[1].byte_time = 1.0
+        make_due(controller.pumps["P2"])
+        _, scans, _ = controller.create_api_and_tasks()
+        tasks = [asyncio.create_task(scan()) for scan in scans]
+        await asyncio.sleep(0.35)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await controller.disconnect()
+        for server in servers:
+            server.close()
+
+    asyncio.run(run())
+    assert ticks["P2"] == 0
+    assert ticks["P1"] >= 3  # a tick every 0.1 s
@@ -0,0 +1,194 @@
+import asyncio
+
+import pytest
+from fastcs.attributes import AttrR
+from fastcs.datatypes import String
+from fastcs.logging import logger
+
+from fastcs_wpi_micro4.poll_scheduler import (
+    BURST_POLLS,
+    POLL_TICK,
+    WpiMicro4PollScheduler,
+)
+from fastcs_wpi_micro4.simulator import WpiMicro4Simulator
+from fastcs_wpi_micro4.usb_connection import (
+    ResponseTimeoutError,
+    USBConnectionSettings,
+)
+from fastcs_wpi_micro4.wpi_micro4_controller import WpiMicro4Controller
+from fastcs_wpi_micro4.wpi_micro4_controller_query import (
+    WpiMicro4ControllerQueryIORef,
+)
+from stubs import StubIO, StubLineConnection
+
+
+def make_scheduler():  # pyright: ignore[reportUnknownParameterType]
+    connection, io = StubLineConnection(), StubIO()
+    scheduler = WpiMicro4PollScheduler(connection)  # pyright: ignore[reportArgumentType]
+    attrs = {}
+    for line in (1, 2):
+        for query in ("C", "G"):
+            attr = AttrR(  # pyright: ignore[reportUnknownVariableType]
+                String(),
+                io_ref=WpiMicro4ControllerQueryIORef(query, line),  # pyright: ignore[reportCallIssue]
+            )
+            scheduler.add(attr, io, 0.5)  # pyright: ignore[reportUnknownMemberType]
+            attrs[f"{query}{line}"] = attr
+    return scheduler, connection, attrs  # pyright: ignore[reportUnknownVariableType]
+
+
+def test_due_queries_of_every_line_go_out_in_one_transaction():
+    scheduler, connection, attrs = make_scheduler()
+
+    asyncio.run(scheduler.tick())
+
+    assert connection.batches == [[(1, "?C\r"), (1, "?G\r"), (2, "?C\r"), (2, "?G\r")]]
+    assert attrs["C1"].get() == "?C1>reply"  # pyright: ignore[reportUnknownMemberType]
+    assert attrs["G2"].get() == "?G2>reply"  # pyright: ignore[reportUnknownMemberType]
+
+
+def test_lines_not_fitted_are_skipped():
+    scheduler, connection, _ = make_scheduler()
+    connection.fitted_lines = (2,)
+
+    asyncio.run(scheduler.tick())
+
+    assert connection.batches == [[(2, "?C\r"), (2, "?G\r")]]
+
+
+def test_entries_are_not_polled_again_before_their_period():
+    scheduler, connection, _ = make_scheduler()
+
+    async def run():
+        await scheduler.tick()
+        await scheduler.tick()
+
+    asyncio.run(run())
+
+    assert len(connection.batches) == 1
+
+
+def test_idle_line_is_polled_at_its_idle_period():
+    scheduler, _, _ = make_scheduler()
+    for entry in scheduler._entries:  # pyright: ignore[reportPrivateUsage]
+        entry.idle_period = 5.0
+    scheduler.set_motor_state(2, "Stopped")
+
+    async def run():
+        await scheduler.tick()
+        return asyncio.get_running_loop().time()
+
+    now = asyncio.run(run())
+    next_due = {
+        entry.line: entry.next_due - now
+        for entry in scheduler._entries  # pyright: ignore[reportPrivateUsage]
+    }
+    assert next_due[1] == pytest.approx(0.5, abs=0.05)
+    assert next_due[2] == pytest.approx(5.0, abs=0.05)
+
+
+def test_burst_polls_the_line_at_every_tick_after_a_state_write():
+    scheduler, connection, _ = make_scheduler()
+    for entry in scheduler._entries:  # pyright: ignore[reportPrivateUsage]
+        entry.idle_period = 5.0
+    scheduler.set_motor_state(1, "Stopped")
+    scheduler.set_motor_state(2, "Stopped")
+
+    async def run():
+        await scheduler.tick()
+        scheduler.burst(1)
+        for _ in range(BURST_POLLS + 1):
+            await asyncio.sleep(POLL_TICK)
+            await scheduler.tick()
+
+    asyncio.run(run())
+    lines_polled = [{line for line, _ in batch} for batch in connection.batches]
+    assert lines_polled == [{1, 2}] + [{1}] * BURST_POLLS
+
+
+def test_failed_sweep_keeps_the_cadence():
+    scheduler, connection, attrs = make_scheduler()
+
+    async def fail(
+        queries: list[tuple[int | None, str]], periodic: bool = False
+    ) -> list[str]:
+        raise ResponseTimeoutError("lost reply")
+
+    connection.send_line_queries = fail
+
+    async def run():
+        await scheduler.tick()
+        return asyncio.get_running_loop().time()
+
+    now = asyncio.run(run())
+    assert all(
+        entry.next_due - now == pytest.approx(0.5, abs=0.05)
+        for entry in scheduler._entries  # pyright: ignore[reportPrivateUsage]
+    )
+    assert attrs["C1"].get() == ""  # pyright: ignore[reportUnknownMemberType]
+
+
+def test_poll_failures_are_logged_when_they_start_and_end():
+    scheduler, connection, _ = make_scheduler()
+    send_line_queries = connection.send_line_queries
+    failing = True
+
+    async def flaky(
+        queries: list[tuple[int | None, str]], periodic: bool = False
+    ) -> list[str]:
+        if failing:
+            raise ResponseTimeoutError("lost reply")
+        return await send_line_queries(queries, periodic)
+
+    connection.send_line_queries = flaky
+    messages: list[str] = []
+    sink = logger.add(lambda message: messages.append(message.record["message"]))  # pyright: ignore[reportUnknownArgumentType, reportUnknownLambdaType, reportUnknownMemberType]
+
+    async def run():
+        nonlocal failing
+        for _ in range(3):
+            scheduler.burst(1)
+            await scheduler.tick()
+        failing = False
+        scheduler.burst(1)
+        await scheduler.tick()
+
+    try:
+        asyncio.run(run())
+    finally:
+        logger.remove(sink)
+    assert messages == ["Polls failing", "Polls answered again"]
+
+
+def test_scan_tasks_poll_once_the_controller_has_connected():
+    simulator = WpiMicro4Simulator(baudrate=None)
+    ticks = 0
+
+    async def run():
+        nonlocal ticks
+        server = await simulator.start_tcp()
+        url = f"socket://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        controller = WpiMicro4Controller(USBConnectionSettings(url), lines=(1, 2))
+        scheduler = controller._poll_scheduler  # pyright: ignore[reportPrivateUsage]
+        tick = scheduler.tick
+
+        async def counted_tick():
+            nonlocal ticks
+            ticks += 1
+            await tick()
+
+        scheduler.tick = counted_tick
+        controller.post_initialise()  # pyright: ignore[reportUnknownMemberType]
+        _, scans, _ = controller.create_api_and_tasks()
+        await controller.connect()
+        tasks = [asyncio.create_task(scan()) for scan in scans]
+        await asyncio.sleep(POLL_TICK * 3)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await controller.disconnect()
+        server.close()
+
+    asyncio.run(run())
+    # the scan tasks wait for _connected, which the connect override has to set
+    assert ticks >= 2
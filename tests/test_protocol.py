@@ -0,0 +1,58 @@
+import pytest
+
+from fastcs_wpi_micro4.protocol import (
+    NumberReply,
+    SyringeReply,
+    TextReply,
+    UnexpectedReplyError,
+    parse_reply,
+)
+
+
+@pytest.mark.parametrize(
+    "letter, response, expected",
+    [
+        ("V", "?V>Target Volume = 200.6nL \n\rOK\n\r", NumberReply(200.6, "nL")),
+        ("R", "?R>Rate = 0.7 \n\rOK\n\r", NumberReply(0.7)),
+        ("C", "?C>Volume Counter = 12.1nL \n\rOK\n\r", NumberReply(12.1, "nL")),
+        ("C", ">Volume Counter = 1210.0uL \n\rOK\n\r", NumberReply(1210.0, "uL")),
+        ("D", "?D>Direction: Withdraw\n\r>OK\n\r", TextReply("Withdraw")),
+        ("G", "?G>Motor State: Stopped\n\r>OK\n\r", TextReply("Stopped")),
+        ("U", "?U>Rate Units: nL/Min\n\r>OK\n\r", TextReply("nL/Min")),
+        ("M", "?M>Mode: Non-Grouped\n\r>OK\n\r", TextReply("Non-Grouped")),
+        ("B", "?B>Smooth Drive\n\r>OK\n\r", TextReply("Smooth Drive")),
+        ("E", ">Delivered Volume\n\r>OK\n\r", TextReply("Delivered Volume")),
+        (
+            "S",
+            "?S>Type A, 10.0uL, 60.0\n\r>OK\n\r",
+            SyringeReply("Type A", 10.0, "uL", 60.0),
+        ),
+    ],
+)
+def test_parse_reply(letter: str, response: str, expected: object):
+    assert parse_reply(letter, response) == expected
+
+
+def test_parse_reply_rejects_reply_to_another_query():
+    with pytest.raises(UnexpectedReplyError):
+        parse_reply("C", "?G>Motor State: Stopped\n\r>OK\n\r")
+
+
+def test_parsed_replies_are_immutable():
+    reply = parse_reply("C", "?C>Volume Counter = 12.1nL \n\rOK\n\r")
+    with pytest.raises(AttributeError):
+        reply.value = 0.0  # pyright: ignore[reportAttributeAccessIssue]
+
+
+@pytest.mark.parametrize(
+    "letter, response",
+    [
+        ("C", "?C>Volume Counter = nL \n\rOK\n\r"),
+        ("C", "?C>Volume Counter = 12.1mL \n\rOK\n\r"),
+        ("G", "?G>Motor State: \n\r>OK\n\r"),
+        ("S", "?S>Type A\n\r>OK\n\r"),
+    ],
+)
+def test_parse_reply_rejects_malformed_reply(letter: str, response: str):
+    with pytest.raises(UnexpectedReplyError):
+        parse_reply(letter, response)
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from fastcs_wpi_micro4.simulator import WpiMicro4Simulator
+from fastcs_wpi_micro4.usb_connection import (
+    LINK_LOST_TIMEOUTS,
+    QUERY_TIMEOUT,
+    RESYNC_QUIET,
+    DisconnectedError,
+    ErrorReplyError,
+    ResponseTimeoutError,
+    USBConnection,
+    USBConnectionSettings,
+)
+
+
+async def connected(simulator: WpiMicro4Simulator):
+    server = await simulator.start_tcp()
+    connection = USBConnection()
+    await connection.connect(
+        USBConnectionSettings(
+            f"socket://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        )
+    )
+    return server, connection
+
+
+def test_error_reply_is_raised_and_the_link_stays_usable():
+    simulator = WpiMicro4Simulator(baudrate=9600)
+
+    async def run():
+        server, connection = await connected(simulator)
+        with pytest.raises(ErrorReplyError):
+            await connection.send_line_queries([(1, "?X\r"), (1, "?G\r")])
+        response = await connection.send_query("?G\r", 1)
+        await connection.close()
+        server.close()
+        return response
+
+    assert asyncio.run(run()) == "?G>Motor State: Stopped\n\r>OK\n\r"
+
+
+def test_recovery_from_a_dropped_byte_is_bounded():
+    simulator = WpiMicro4Simulator(baudrate=9600)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        server, connection = await connected(simulator)
+        await connection.select_line(1)
+        simulator.corrupt_replies = 1
+        start = loop.time()
+        with pytest.raises(ResponseTimeoutError):
+            await connection.send_line_queries([(1, "?C\r"), (1, "?G\r"), (1, "?V\r")])
+        recovery = loop.time() - start
+        responses = await connection.send_line_queries([(1, "?C\r"), (1, "?G\r")])
+        await connection.close()
+        server.close()
+        return recovery, responses
+
+    recovery, responses = asyncio.run(run())
+    # the replies after the corrupted one are swallowed into it, the last one times
+    # out and the input is drained until quiet
+    assert recovery < 3 * 0.05 + QUERY_TIMEOUT + 2 * RESYNC_QUIET
+    assert responses == [
+        "?C>Volume Counter = 0.0nL \n\rOK\n\r",
+        "?G>Motor State: Stopped\n\r>OK\n\r",
+    ]
+
+
+def test_replies_timing_out_in_a_row_lose_the_link():
+    simulator = WpiMicro4Simulator(baudrate=None)
+
+    async def run():
+        server, connection = await connected(simulator)
+        simulator.corrupt_replies = LINK_LOST_TIMEOUTS
+        for _ in range(LINK_LOST_TIMEOUTS - 1):
+            with pytest.raises(ResponseTimeoutError):
+                await connection.send_query("?G\r")
+        with pytest.raises(DisconnectedError):
+            await connection.send_query("?G\r")
+        server.close()
+        return connection
+
+    connection = asyncio.run(run())
+    assert connection.link_lost.is_set()
+    assert not connection.connected
@@ -0,0 +1,117 @@
+import asyncio
+
+from fastcs_wpi_micro4.simulator import WpiMicro4Simulator
+from fastcs_wpi_micro4.usb_connection import USBConnection, USBConnectionSettings
+from fastcs_wpi_micro4.wpi_micro4_controller import WpiMicro4Controller
+
+
+async def serve(simulator: WpiMicro4Simulator) -> tuple[asyncio.Server, str]:
+    server = await simulator.start_tcp()
+    return server, f"socket://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+
+def test_controller_reads_every_line_from_the_simulator():
+    simulator = WpiMicro4Simulator(lines=3, baudrate=None)
+    simulator.lines[1].rate = 3.5
+
+    async def run():
+        server, url = await serve(simulator)
+        controller = WpiMicro4Controller(USBConnectionSettings(url))
+        await controller.initialise()
+        await controller.connect()
+        await controller.connection.close()
+        server.close()
+        return controller
+
+    controller = asyncio.run(run())
+    assert controller.connection.fitted_lines == (1, 2, 3)
+    assert not hasattr(controller, "delivery_rate_l4")
+    assert controller.delivery_rate_l1.get() == 0.7  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+    assert controller.delivery_rate_l2.get() == 3.5  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+    assert controller.delivery_rate_l3.get() == 0.7  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+    assert controller.type_l1.get() == "Type A"  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+    assert controller.syringe_volume_l1.get() == "10.0uL"  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+
+
+def test_lines_no_longer_fitted_are_not_polled():
+    simulator = WpiMicro4Simulator(lines=3, baudrate=None)
+
+    async def run():
+        server, url = await serve(simulator)
+        controller = WpiMicro4Controller(USBConnectionSettings(url), lines=(1, 2, 3))
+        await controller.connect()
+        simulator.lines.pop()  # line 3 unplugged while the link was down
+        await controller.refresh()
+        await controller.poll_once()
+        await controller.emergency_stop.put(True)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+        await controller.connection.close()
+        server.close()
+        return controller
+
+    controller = asyncio.run(run())
+    assert controller.connection.fitted_lines == (1, 2)
+    assert controller.connection.statistics.error_replies == 1  # only the probe
+
+
+def test_running_line_advances_its_counter_at_the_set_rate():
+    simulator = WpiMicro4Simulator(baudrate=None)
+
+    async def run():
+        server, url = await serve(simulator)
+        connection = USBConnection()
+        await connection.connect(USBConnectionSettings(url))
+        for command in ("S\r", "R100\r", "V1000\r", "G\r"):
+            await connection.send_query(command, 2)
+        await asyncio.sleep(0.2)
+        responses = await connection.send_line_queries(
+            [(1, "?C\r"), (2, "?C\r"), (2, "?G\r")]
+        )
+        await connection.close()
+        server.close()
+        return responses
+
+    counter1, counter2, state2 = asyncio.run(run())
+    assert counter1 == "?C>Volume Counter = 0.0nL \n\rOK\n\r"
+    assert 15 < float(counter2.split("= ")[1].split("nL")[0]) < 40
+    assert state2 == "?G>Motor State: Running\n\r>OK\n\r"
+
+
+def test_first_advance_counts_from_the_first_exchange():
+    simulator = WpiMicro4Simulator(baudrate=None)
+    line = simulator.lines[0]
+    line.target_volume, line.rate, line.motor_state = 1e9, 60.0, "Running"
+
+    async def run():
+        server, url = await serve(simulator)
+        connection = USBConnection()
+        await connection.connect(USBConnectionSettings(url))
+        await asyncio.sleep(0.1)
+        response = await connection.send_query("?C\r", 1)
+        await connection.close()
+        server.close()
+        return response
+
+    response = asyncio.run(run())
+    # not the rate times the uptime of the loop clock
+    assert float(response.split("= ")[1].split("nL")[0]) < 1
+
+
+def test_link_is_paced_at_the_baud_rate():
+    simulator = WpiMicro4Simulator(baudrate=9600)
+
+    async def run():
+        server, url = await serve(simulator)
+        connection = USBConnection()
+        await connection.connect(USBConnectionSettings(url))
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        responses = await connection.send_line_queries([(None, "?G\r")] * 5)
+        elapsed = loop.time() - start
+        await connection.close()
+        server.close()
+        return responses, elapsed
+
+    responses, elapsed = asyncio.run(run())
+    # the link is full duplex, the replies go out back-to-back behind the first query
+    assert elapsed >= (4 + 5 * len(responses[0])) * 10 / 9600
+    assert responses == ["?G>Motor State: Stopped\n\r>OK\n\r"] * 5
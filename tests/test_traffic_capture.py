@@ -0,0 +1,92 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from fastcs_wpi_micro4.simulator import WpiMicro4Simulator
+from fastcs_wpi_micro4.traffic_capture import (
+    CapturedExchange,
+    WpiMicro4TrafficReplay,
+    pair_exchanges,
+    read_capture,
+)
+from fastcs_wpi_micro4.usb_connection import USBConnectionSettings
+from fastcs_wpi_micro4.wpi_micro4_controller import WpiMicro4Controller
+
+
+def test_pair_exchanges_follows_the_line_and_drops_drained_exchanges():
+    records = [
+        (1.0, ">", "L2\r?C\r?G\r"),
+        (1.1, "<", "L2\n\r>OK\n\r"),
+        (1.2, "<", "?C>Volume Counter = 1.0nL \n\rOK\n\r"),
+        (1.5, "!", "?G>Motor State: Sto"),
+        (2.0, ">", "?C\r"),
+        (2.05, "<", "?C>Volume Counter = 2.0nL \n\rOK\n\r"),
+    ]
+
+    assert pair_exchanges(iter(records)) == [
+        CapturedExchange(None, "L2\r", "L2\n\r>OK\n\r", pytest.approx(0.1)),  # pyright: ignore[reportArgumentType]
+        CapturedExchange(
+            2,
+            "?C\r",
+            "?C>Volume Counter = 1.0nL \n\rOK\n\r",
+            pytest.approx(0.1),  # pyright: ignore[reportArgumentType]
+        ),
+        CapturedExchange(
+            None,
+            "?C\r",
+            "?C>Volume Counter = 2.0nL \n\rOK\n\r",
+            pytest.approx(0.05),  # pyright: ignore[reportArgumentType]
+        ),
+    ]
+
+
+async def run_controller(url: str, capture_path: Path | None = None):
+    controller = WpiMicro4Controller(
+        USBConnectionSettings(url, capture_path=capture_path and str(capture_path)),
+        lines=(1, 2),
+    )
+    controller.post_initialise()  # pyright: ignore[reportUnknownMemberType]
+    await controller.connect()
+    await controller.poll_once()
+    await controller.delivery_rate_l2.put(2.5)  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+    await controller.disconnect()
+    return controller
+
+
+def test_replayed_session_reproduces_the_captured_values(tmp_path: Path):
+    capture = tmp_path / "session.log"
+    simulator = WpiMicro4Simulator(baudrate=9600)
+    simulator.lines[0].counter = 12.1
+
+    async def record():
+        server = await simulator.start_tcp()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        controller = await run_controller(
+            f"socket://127.0.0.1:{server.sockets[0].getsockname()[1]}", capture
+        )
+        server.close()
+        return controller, loop.time() - start
+
+    async def replay():
+        device = WpiMicro4TrafficReplay.from_capture(capture, speed=10)
+        server = await device.start_tcp()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        controller = await run_controller(
+            f"socket://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        )
+        server.close()
+        return controller, loop.time() - start
+
+    recorded, record_time = asyncio.run(record())
+    replayed, replay_time = asyncio.run(replay())
+
+    directions = {direction for _, direction, _ in read_capture(capture)}
+    assert directions == {">", "<"}
+    for name in ("volume_couner_l1", "delivery_rate_l2", "type_l2", "pump_state_l1"):
+        assert getattr(replayed, name).get() == getattr(recorded, name).get()
+    assert replayed.volume_couner_l1.get() == 12.1  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+    assert replayed.delivery_rate_l2.get() == 2.5  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+    assert replay_time < record_time
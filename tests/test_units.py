@@ -0,0 +1,71 @@
+import asyncio
+
+from fastcs.attributes import AttrR, AttrRW
+from fastcs.datatypes import Float, String
+
+from fastcs_wpi_micro4.command_table import RATE_UNITS_NAMES
+from fastcs_wpi_micro4.units import UnitCache
+from fastcs_wpi_micro4.wpi_micro4_controller_command_setting import (
+    WpiMicro4ControllerCommandSettingIO,
+    WpiMicro4ControllerCommandSettingIORef,
+)
+from fastcs_wpi_micro4.wpi_micro4_controller_query import (
+    WpiMicro4ControllerQueryIO,
+    WpiMicro4ControllerQueryIORef,
+)
+from fastcs_wpi_micro4.wpi_micro4_controller_value_setting import (
+    WpiMicro4ControllerValueSettingIO,
+    WpiMicro4ControllerValueSettingIORef,
+)
+from stubs import StubReplyConnection
+
+
+def test_volumes_are_converted_with_the_unit_of_their_reply():
+    units = UnitCache()
+    io = WpiMicro4ControllerQueryIO(None, units)  # pyright: ignore[reportArgumentType]
+    counter = AttrR(Float(), io_ref=WpiMicro4ControllerQueryIORef("C", 1))  # pyright: ignore[reportCallIssue, reportUnknownVariableType]
+    counter_nl = units.add_volume(counter)  # pyright: ignore[reportUnknownMemberType, reportUnknownVariableType]
+
+    async def run():  # pyright: ignore[reportUnknownParameterType]
+        await io.set("?C>Volume Counter = 950.0nL \n\rOK\n\r", counter)  # pyright: ignore[reportUnknownArgumentType, reportUnknownMemberType]
+        in_nl = counter_nl.get()  # pyright: ignore[reportUnknownVariableType]
+        await io.set("?C>Volume Counter = 1.2uL \n\rOK\n\r", counter)  # pyright: ignore[reportUnknownArgumentType, reportUnknownMemberType]
+        return in_nl  # pyright: ignore[reportUnknownVariableType]
+
+    assert asyncio.run(run()) == 950.0  # pyright: ignore[reportUnknownArgumentType]
+    assert counter.get() == 1.2
+    assert counter_nl.get() == 1200.0
+
+
+def test_rate_is_converted_with_the_cached_units_until_a_units_write():
+    units = UnitCache()
+    connection = StubReplyConnection(
+        {"M\r": "M\n\r>OK\n\r", "?U\r": "?U>Rate Units: nL/Min\n\r>OK\n\r"}
+    )
+    value_io = WpiMicro4ControllerValueSettingIO(connection, units)  # pyright: ignore[reportArgumentType]
+    command_io = WpiMicro4ControllerCommandSettingIO(connection)  # pyright: ignore[reportArgumentType]
+    rate = AttrRW(  # pyright: ignore[reportUnknownVariableType]
+        Float(prec=1),
+        io_ref=WpiMicro4ControllerValueSettingIORef("R", 1, command="R"),  # pyright: ignore[reportCallIssue]
+    )
+    rate_units = AttrRW(  # pyright: ignore[reportUnknownVariableType]
+        String(),
+        io_ref=WpiMicro4ControllerCommandSettingIORef("U", 1, names=RATE_UNITS_NAMES),  # pyright: ignore[reportCallIssue]
+    )
+    rate_nl_s = units.add_rate(1, rate, rate_units)  # pyright: ignore[reportUnknownMemberType, reportUnknownVariableType]
+
+    async def run():  # pyright: ignore[reportUnknownParameterType]
+        # the initial sweep reads the rate before its units
+        await value_io.set("?R>Rate = 12.0 \n\rOK\n\r", rate)  # pyright: ignore[reportUnknownArgumentType, reportUnknownMemberType]
+        before_units = rate_nl_s.get()  # pyright: ignore[reportUnknownVariableType]
+        await command_io.set("?U>Rate Units: nL/Sec\n\r>OK\n\r", rate_units)  # pyright: ignore[reportUnknownArgumentType, reportUnknownMemberType]
+        in_seconds = rate_nl_s.get()  # pyright: ignore[reportUnknownVariableType]
+        await command_io.send(rate_units, "nL/Min")  # pyright: ignore[reportUnknownArgumentType]
+        return before_units, in_seconds  # pyright: ignore[reportUnknownVariableType]
+
+    before_units, in_seconds = asyncio.run(run())  # pyright: ignore[reportUnknownArgumentType, reportUnknownVariableType]
+    assert before_units == 0.0
+    assert in_seconds == 12.0
+    assert rate_nl_s.get() == 0.2
+    # the conversions took no query, only the units write and its readback
+    assert connection.messages == ["M\r", "?U\r"]
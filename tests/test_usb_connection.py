@@ -0,0 +1,171 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastcs.attributes import AttrR
+from fastcs.datatypes import Float, Int
+
+from fastcs_wpi_micro4.usb_connection import (
+    MAX_PENDING,
+    PollDroppedError,
+    TimedReply,
+    USBConnection,
+    USBConnectionSettings,
+    match_responses,
+)
+from fastcs_wpi_micro4.wpi_micro4_controller_line_setting import (
+    WpiMicro4ControllerLineSettingIO,
+    WpiMicro4ControllerLineSettingIORef,
+)
+from fastcs_wpi_micro4.wpi_micro4_controller_query import (
+    WpiMicro4ControllerQueryIO,
+    WpiMicro4ControllerQueryIORef,
+)
+
+REPLIES = {
+    "?V": "?V>Target Volume = 200.6nL \n\rOK\n\r",
+    "?R": "?R>Rate = 0.7 \n\rOK\n\r",
+    "?C": "?C>Volume Counter = 12.1nL \n\rOK\n\r",
+    "?G": "?G>Motor State: Stopped\n\r>OK\n\r",
+    "L1": "L1\n\r>OK\n\r",
+    "L2": "L2\n\r>OK\n\r",
+}
+
+
+class FakeWriter:
+    """Answers every ``\\r`` terminated query written to it on the paired reader."""
+
+    def __init__(self, reader: asyncio.StreamReader):
+        self.reader = reader
+        self.writes: list[bytes] = []
+
+    def write(self, data: bytes):
+        self.writes.append(data)
+        for query in data.decode().split("\r")[:-1]:
+            self.reader.feed_data(REPLIES[query].encode())
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+async def connected() -> tuple[USBConnection, FakeWriter]:
+    reader = asyncio.StreamReader()
+    writer = FakeWriter(reader)
+
+    async def open_serial_connection(**kwargs):  # pyright: ignore[reportMissingParameterType, reportUnknownParameterType]
+        return reader, writer
+
+    connection = USBConnection()
+    with patch(
+        "fastcs_wpi_micro4.usb_connection.serial_asyncio.open_serial_connection",
+        open_serial_connection,  # pyright: ignore[reportUnknownArgumentType]
+    ):
+        await connection.connect(USBConnectionSettings())
+    return connection, writer
+
+
+def test_line_queries_pipeline_in_one_write():
+    async def run():
+        connection, writer = await connected()
+        responses = await connection.send_line_queries(
+            [(None, "?C\r"), (None, "?G\r"), (None, "?V\r")]
+        )
+        return responses, writer.writes
+
+    responses, writes = asyncio.run(run())
+    assert writes == [b"?C\r?G\r?V\r"]
+    assert responses == [REPLIES["?C"], REPLIES["?G"], REPLIES["?V"]]
+
+
+def test_line_queries_switch_each_line_once_starting_with_the_selected_one():
+    async def run():
+        connection, writer = await connected()
+        await connection.select_line(2)
+        responses = await connection.send_line_queries(
+            [(1, "?C\r"), (2, "?C\r"), (1, "?G\r"), (2, "?G\r")]
+        )
+        again = await connection.send_line_queries([(1, "?V\r")])
+        return responses, again, writer.writes
+
+    responses, again, writes = asyncio.run(run())
+    assert writes == [b"L2\r", b"?C\r?G\rL1\r?C\r?G\r", b"?V\r"]
+    assert responses == [REPLIES["?C"], REPLIES["?C"], REPLIES["?G"], REPLIES["?G"]]
+    assert again == [REPLIES["?V"]]
+
+
+def test_pump_number_shows_the_line_the_last_transaction_selected():
+    attr = AttrR(Int(), io_ref=WpiMicro4ControllerLineSettingIORef(), initial_value=1)  # pyright: ignore[reportCallIssue, reportUnknownVariableType]
+
+    async def run():  # pyright: ignore[reportUnknownParameterType]
+        connection, _ = await connected()
+        io = WpiMicro4ControllerLineSettingIO(connection)
+        await io.update(attr)  # pyright: ignore[reportUnknownArgumentType]
+        unknown = attr.get()  # pyright: ignore[reportUnknownVariableType]
+        await connection.send_line_queries([(1, "?C\r"), (2, "?G\r")])
+        await io.update(attr)  # pyright: ignore[reportUnknownArgumentType]
+        return unknown, attr.get()  # pyright: ignore[reportUnknownVariableType]
+
+    assert asyncio.run(run()) == (1, 2)  # pyright: ignore[reportUnknownArgumentType]
+
+
+def test_polls_backed_up_behind_the_link_are_shared_or_dropped_but_writes_are_not():
+    async def run():
+        connection, writer = await connected()
+        async with connection._transaction():  # pyright: ignore[reportPrivateUsage]
+            # the link is held, e.g. by a slow exchange
+            polls = [
+                asyncio.create_task(connection.send_query("?C\r", 1, periodic=True))
+                for _ in range(3)
+            ]
+            writes = [
+                asyncio.create_task(connection.send_query("?V\r", 1))
+                for _ in range(MAX_PENDING)
+            ]
+            await asyncio.sleep(0)
+            with pytest.raises(PollDroppedError):
+                await connection.send_query("?G\r", 1, periodic=True)
+        results = await asyncio.gather(*polls, *writes)
+        return results, writer.writes, connection.statistics
+
+    results, writes, statistics = asyncio.run(run())
+    assert results == [REPLIES["?C"]] * 3 + [REPLIES["?V"]] * MAX_PENDING
+    # the three polls went out as one exchange, every write went out
+    assert writes == [b"L1\r?C\r"] + [b"?V\r"] * MAX_PENDING
+    assert statistics.coalesced_polls == 2
+    assert statistics.dropped_polls == 1
+    assert statistics.pending_max == MAX_PENDING + 2
+
+
+def test_replies_are_stamped_with_the_midpoint_of_their_exchange():
+    async def run():
+        connection, _ = await connected()
+        loop = asyncio.get_running_loop()
+        before = loop.time()
+        responses = await connection.send_line_queries([(None, "?C\r"), (None, "?G\r")])
+        return before, responses, loop.time()
+
+    before, (counter, state), after = asyncio.run(run())
+    assert before <= counter.midpoint <= state.midpoint <= after  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+
+
+def test_read_time_is_the_midpoint_the_reply_is_stamped_with():
+    io = WpiMicro4ControllerQueryIO(None)  # pyright: ignore[reportArgumentType]
+    attr = AttrR(Float(), io_ref=WpiMicro4ControllerQueryIORef("C", 1))  # pyright: ignore[reportCallIssue, reportUnknownVariableType]
+    response = TimedReply("?C>Volume Counter = 1.5nL \n\rOK\n\r")
+    response.midpoint = 12.5
+
+    asyncio.run(io.set(response, attr))  # pyright: ignore[reportUnknownArgumentType, reportUnknownMemberType]
+
+    assert attr.get() == 1.5
+    assert io.read_time(attr) == 12.5  # pyright: ignore[reportUnknownMemberType]
+
+
+def test_match_responses_rejects_reply_for_another_query():
+    with pytest.raises(ValueError):
+        match_responses(["?C\r", "?G\r"], [REPLIES["?G"], REPLIES["?C"]])
@@ -0,0 +1,53 @@
+import asyncio
+
+from fastcs.attributes import AttrR
+from fastcs.datatypes import Float, String
+
+from fastcs_wpi_micro4.volume_estimator import VolumeEstimator
+
+
+def make_estimator(counter_mode: str = "Delivered Volume") -> VolumeEstimator:
+    def attr(datatype, value):  # pyright: ignore[reportMissingParameterType, reportUnknownParameterType]
+        return AttrR(datatype, initial_value=value)  # pyright: ignore[reportUnknownArgumentType, reportUnknownVariableType]
+
+    return VolumeEstimator(
+        attr(Float(), 0.0),
+        attr(Float(), 100.0),
+        attr(Float(), 2.0),
+        attr(String(), counter_mode),
+        attr(String(), "Running"),
+    )
+
+
+def test_estimate_extrapolates_between_readings_and_snaps_to_them():
+    estimator = make_estimator()
+
+    assert estimator.record_reading(10.0, 0.0) == 0.0
+    assert estimator.volume_at(0.1) == 10.2
+    # the counter fell behind the rate, the estimate was 0.05 nL ahead
+    assert round(estimator.record_reading(10.45, 0.25), 6) == 0.05
+    assert estimator.volume_at(0.25) == 10.45
+
+
+def test_estimate_is_clamped_to_the_target_or_zero():
+    estimator = make_estimator()
+    estimator.record_reading(99.0, 0.0)
+    assert estimator.volume_at(5.0) == 100.0
+
+    estimator = make_estimator("Remaining Volume")
+    estimator.record_reading(1.0, 0.0)
+    assert estimator.volume_at(0.25) == 0.5
+    assert estimator.volume_at(5.0) == 0.0
+
+
+def test_estimate_holds_while_the_motor_is_stopped():
+    estimator = make_estimator()
+    estimator.record_reading(10.0, 0.0)
+
+    async def run():
+        await estimator._motor_state.update("Stopped")  # pyright: ignore[reportAttributeAccessIssue, reportPrivateUsage, reportUnknownMemberType]
+        await estimator.publish(5.0)
+
+    asyncio.run(run())
+
+    assert estimator.estimate.get() == 10.0
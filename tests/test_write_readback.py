@@ -0,0 +1,157 @@
+import asyncio
+
+from fastcs.attributes import AttrRW
+from fastcs.datatypes import Float, String
+
+from fastcs_wpi_micro4.command_table import DIRECTION_NAMES, STATE_NAMES
+from fastcs_wpi_micro4.simulator import WpiMicro4Simulator
+from fastcs_wpi_micro4.usb_connection import (
+    MAX_PENDING,
+    USBConnection,
+    USBConnectionSettings,
+)
+from fastcs_wpi_micro4.wpi_micro4_controller_command_setting import (
+    WpiMicro4ControllerCommandSettingIO,
+    WpiMicro4ControllerCommandSettingIORef,
+)
+from fastcs_wpi_micro4.wpi_micro4_controller_state_setting import (
+    WpiMicro4ControllerStateSettingIO,
+    WpiMicro4ControllerStateSettingIORef,
+)
+from fastcs_wpi_micro4.wpi_micro4_controller_value_setting import (
+    WpiMicro4ControllerValueSettingIO,
+    WpiMicro4ControllerValueSettingIORef,
+)
+from fastcs_wpi_micro4.write_coalescer import WriteCoalescer
+from stubs import StubReplyConnection
+
+
+def value_attr(letter: str) -> AttrRW:  # pyright: ignore[reportMissingTypeArgument, reportUnknownParameterType]
+    return AttrRW(  # pyright: ignore[reportUnknownVariableType]
+        Float(prec=1),
+        io_ref=WpiMicro4ControllerValueSettingIORef(letter, 1, command=letter),  # pyright: ignore[reportCallIssue]
+    )
+
+
+def test_volume_write_reads_back_from_its_echo():
+    connection = StubReplyConnection(
+        {"V200.6\r": "V200.6>Target Volume = 200.6nL \n\rOK\n\r"}
+    )
+    io = WpiMicro4ControllerValueSettingIO(connection)  # pyright: ignore[reportArgumentType]
+    attr = value_attr("V")  # pyright: ignore[reportUnknownVariableType]
+
+    asyncio.run(io.send(attr, 200.6))  # pyright: ignore[reportUnknownArgumentType]
+
+    assert connection.messages == ["V200.6\r"]
+    assert attr.get() == 200.6
+
+
+def test_echo_disagreeing_with_the_setpoint_falls_back_to_a_query():
+    connection = StubReplyConnection(
+        {
+            "R0.7\r": "R0.7>Rate = 7.0 \n\rOK\n\r",
+            "?R\r": "?R>Rate = 0.7 \n\rOK\n\r",
+        }
+    )
+    io = WpiMicro4ControllerValueSettingIO(connection)  # pyright: ignore[reportArgumentType]
+    attr = value_attr("R")  # pyright: ignore[reportUnknownVariableType]
+
+    asyncio.run(io.send(attr, 0.7))  # pyright: ignore[reportUnknownArgumentType]
+
+    assert connection.messages == ["R0.7\r", "?R\r"]
+    assert attr.get() == 0.7
+
+
+def test_command_without_echo_is_read_back_with_a_query():
+    connection = StubReplyConnection(
+        {"I\r": "I\n\r>OK\n\r", "?D\r": "?D>Direction: Infuse\n\r>OK\n\r"}
+    )
+    io = WpiMicro4ControllerCommandSettingIO(connection)  # pyright: ignore[reportArgumentType]
+    attr = AttrRW(  # pyright: ignore[reportUnknownVariableType]
+        String(),
+        io_ref=WpiMicro4ControllerCommandSettingIORef("D", 1, names=DIRECTION_NAMES),  # pyright: ignore[reportCallIssue]
+    )
+
+    asyncio.run(io.send(attr, "Infuse"))  # pyright: ignore[reportUnknownArgumentType]
+
+    assert connection.messages == ["I\r", "?D\r"]
+    assert attr.get() == "Infuse"
+
+
+def test_setpoints_put_during_a_write_are_coalesced_to_the_latest():
+    connection = StubReplyConnection(
+        {
+            f"V{value:.1f}\r": f"V{value:.1f}>Target Volume = {value:.1f}nL \n\rOK\n\r"
+            for value in range(10)
+        },
+        delay=0.1,  # outlasts the slider
+    )
+    io = WpiMicro4ControllerValueSettingIO(connection)  # pyright: ignore[reportArgumentType]
+    attr = value_attr("V")  # pyright: ignore[reportUnknownVariableType]
+
+    # the readback each put returned with
+    readbacks: list[float] = []
+
+    async def put(value: float):
+        await io.send(attr, value)  # pyright: ignore[reportUnknownArgumentType]
+        readbacks.append(attr.get())  # pyright: ignore[reportUnknownArgumentType]
+
+    async def drag_slider():
+        puts = []
+        for value in range(10):
+            puts.append(asyncio.create_task(put(float(value))))  # pyright: ignore[reportUnknownMemberType]
+            await asyncio.sleep(0.001)
+        await asyncio.gather(*puts)  # pyright: ignore[reportUnknownArgumentType]
+
+    asyncio.run(drag_slider())
+
+    assert connection.messages == ["V0.0\r", "V9.0\r"]
+    assert attr.get() == 9.0
+    # the superseded puts return with the write that replaced them
+    assert readbacks == [9.0] * 10
+
+
+def test_superseded_puts_fail_with_the_write_in_flight():
+    coalescer = WriteCoalescer()
+    attr = value_attr("V")  # pyright: ignore[reportUnknownVariableType]
+
+    async def send(value: float):
+        await asyncio.sleep(0.01)
+        raise ConnectionError("link lost")
+
+    async def drag_slider():  # pyright: ignore[reportUnknownParameterType]
+        puts = []
+        for value in range(3):
+            puts.append(asyncio.create_task(coalescer.write(attr, value, send)))  # pyright: ignore[reportUnknownMemberType]
+            await asyncio.sleep(0)
+        return await asyncio.gather(*puts, return_exceptions=True)  # pyright: ignore[reportUnknownArgumentType, reportUnknownVariableType]
+
+    results = asyncio.run(drag_slider())  # pyright: ignore[reportUnknownArgumentType, reportUnknownVariableType]
+    assert all(isinstance(result, ConnectionError) for result in results)  # pyright: ignore[reportUnknownVariableType]
+
+
+def test_state_write_is_read_back_with_the_polls_backed_up():
+    simulator = WpiMicro4Simulator(baudrate=None)
+    simulator.lines[0].motor_state = "Running"
+    attr = AttrRW(  # pyright: ignore[reportUnknownVariableType]
+        String(),
+        io_ref=WpiMicro4ControllerStateSettingIORef("G", 1, names=STATE_NAMES),  # pyright: ignore[reportCallIssue]
+        initial_value="Running",
+    )
+
+    async def run():
+        server = await simulator.start_tcp()
+        url = f"socket://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        connection = USBConnection()
+        await connection.connect(USBConnectionSettings(url))
+        # as many transactions queued as new periodic reads are dropped behind
+        connection.statistics.pending = MAX_PENDING
+        await WpiMicro4ControllerStateSettingIO(connection).send(attr, "Stop")  # pyright: ignore[reportUnknownArgumentType]
+        await connection.close()
+        server.close()
+        return connection.statistics
+
+    statistics = asyncio.run(run())
+    assert simulator.lines[0].motor_state == "Stopped"
+    assert attr.get() == "Stopped"
+    assert statistics.dropped_polls == 0